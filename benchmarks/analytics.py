@@ -0,0 +1,71 @@
+"""
+Compute time of the dashboard history analytics on synthetic data, without
+a database. The target is under 100 ms for 200 habits over 2 years.
+
+    python -m benchmarks.analytics [--habits 200] [--days 730] [--repeat 10]
+"""
+from datetime import date, datetime, timedelta
+import argparse
+import os
+import statistics
+import time
+
+# Defaults for utils.database when no .env is present
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "habit_tracker_bench")
+
+from bson import ObjectId
+import numpy as np
+import pandas as pd
+
+from utils.analytics import summarize_history
+from utils.models import Habit
+
+
+def synthetic(habits: int, days: int, rate: float, today: date):
+    """Habits and a completion frame shaped like load_completion_frame's output"""
+    rng = np.random.default_rng(0)
+    start = today - timedelta(days=days - 1)
+    categories = ["Health", "Productivity", "Finance", "Learning", "Fitness", "Mindfulness", "Other"]
+
+    habit_docs = [
+        Habit.from_doc({
+            "_id": ObjectId(),
+            "category": categories[i % len(categories)],
+            "start_date": datetime.combine(start + timedelta(days=int(rng.integers(0, days // 2))), datetime.min.time()),
+        })
+        for i in range(habits)
+    ]
+
+    mask = rng.random((habits, days)) < rate
+    rows, cols = np.nonzero(mask)
+    frame = pd.DataFrame({
+        "habit_id": np.array([h.id for h in habit_docs], dtype=object)[rows],
+        "day": pd.Timestamp(start) + pd.to_timedelta(cols, unit="D"),
+    })
+    return habit_docs, frame, start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=200)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--rate", type=float, default=0.7)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    today = date.today()
+    habits, frame, start = synthetic(args.habits, args.days, args.rate, today)
+
+    timings = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        summarize_history(frame, habits, start, today)
+        timings.append((time.perf_counter() - t0) * 1000)
+
+    print(f"{args.habits} habits x {args.days} days, {len(frame)} completions")
+    print(f"median {statistics.median(timings):.1f} ms, min {min(timings):.1f} ms, max {max(timings):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+Data-layer benchmarks for the pages' database work.
+
+Seeds a throwaway database with synthetic users, then times the data calls
+behind each page: latency, MongoDB round trips and peak Python memory per
+operation. Runs against mongomock by default, or a local mongod with --uri.
+
+    python -m benchmarks.data_layer                      # default scenarios on mongomock
+    python -m benchmarks.data_layer --full               # add the thousands-of-habits scenarios
+    python -m benchmarks.data_layer --uri mongodb://localhost:27017
+    python -m benchmarks.data_layer --save baseline.json
+    python -m benchmarks.data_layer --compare baseline.json
+"""
+from datetime import date, datetime, timedelta
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Defaults for utils.database when no .env is present
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "habit_tracker_bench")
+# Measure the queries themselves, not the read-through cache in utils.cache
+os.environ.setdefault("CACHE_ENABLED", "0")
+
+from bson import ObjectId
+from pymongo import monitoring
+
+from utils import database
+from utils.auth import authenticate_user, hash_password
+from utils.indexes import ensure_indexes
+from utils.days import day_number, migrate as add_day_numbers
+from utils.streaks import counters_from_dates
+
+
+# name -> (habits per user, days of history, daily completion probability)
+SCENARIOS = {
+    "new_user": (3, 14, 0.8),
+    "typical": (15, 365, 0.7),
+    "long_history": (10, 3 * 365, 0.9),
+    "many_habits": (500, 30, 0.6),
+}
+
+# Large scenarios, only run with --full (slow to seed on mongomock)
+FULL_SCENARIOS = {
+    "thousands_of_habits": (2000, 90, 0.6),
+    "power_user": (200, 2 * 365, 0.8),
+}
+
+PASSWORD = "benchmark-password"
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """Counts commands sent to the server (real mongod only)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class MockRoundTripCounter:
+    """Counts collection calls that would each be a round trip on a real server"""
+
+    METHODS = (
+        "find", "find_one", "find_one_and_update", "insert_one", "insert_many",
+        "update_one", "update_many", "delete_one", "delete_many", "aggregate",
+        "count_documents", "bulk_write",
+    )
+
+    def __init__(self, collection_class):
+        self.count = 0
+        self._depth = 0
+        for name in self.METHODS:
+            setattr(collection_class, name, self._wrap(getattr(collection_class, name)))
+
+    def _wrap(self, method):
+        counter = self
+
+        def wrapper(*args, **kwargs):
+            # mongomock calls its own public methods internally; count the outer call only
+            if counter._depth == 0:
+                counter.count += 1
+            counter._depth += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                counter._depth -= 1
+
+        return wrapper
+
+
+def setup_backend(uri):
+    """Point utils.database at the benchmark backend and return a round-trip counter"""
+    database.close_client()
+
+    if uri:
+        counter = RoundTripCounter()
+        monitoring.register(counter)
+        database.MONGODB_URI = uri
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("mongomock is not installed: install it (see environment.yml) "
+                             "or pass --uri of a throwaway local mongod")
+        database.MongoClient = mongomock.MongoClient
+        counter = MockRoundTripCounter(mongomock.collection.Collection)
+
+    return counter
+
+
+def seed_user(db, habits: int, days: int, rate: float, today: date, password_hash: str):
+    """Insert one synthetic user with `habits` habits and `days` of completions"""
+    rng = random.Random(habits * 1000 + days)
+    user_id = ObjectId()
+    email = f"bench-{user_id}@example.com"
+
+    db["users"].insert_one({
+        "_id": user_id,
+        "name": "Benchmark User",
+        "email": email,
+        "password": password_hash,
+        "createdAt": datetime.now(),
+    })
+
+    habit_docs = []
+    completion_docs = []
+    start = today - timedelta(days=days - 1)
+    for i in range(habits):
+        habit_id = ObjectId()
+        dates = [start + timedelta(days=d) for d in range(days) if rng.random() < rate]
+        habit_docs.append({
+            "_id": habit_id,
+            "user_id": user_id,
+            "name": f"Habit {i}",
+            "name_key": database.name_key(f"Habit {i}"),
+            "category": rng.choice(["Health", "Productivity", "Finance", "Learning", "Fitness", "Mindfulness", "Other"]),
+            "description": "",
+            "start_date": datetime.combine(start, datetime.min.time()),
+            "created_at": datetime.now(),
+            **counters_from_dates(dates),
+        })
+        completion_docs.extend(
+            {
+                "habit_id": habit_id,
+                "user_id": user_id,
+                "completion_date": datetime.combine(day, datetime.min.time()),
+                "day": day_number(day),
+                "completed": True,
+                "note": "",
+                "logged_at": datetime.now(),
+            }
+            for day in dates
+        )
+        if len(completion_docs) >= 10000:
+            db["completions"].insert_many(completion_docs, ordered=False)
+            completion_docs = []
+
+    if habit_docs:
+        db["habits"].insert_many(habit_docs, ordered=False)
+    if completion_docs:
+        db["completions"].insert_many(completion_docs, ordered=False)
+
+    return str(user_id), email
+
+
+def build_operations(user_id: str, email: str, today: date, days: int):
+    """The data work each page does, as zero-argument callables"""
+    # Imported here so a missing streamlit only affects the page operations
+    import checkin
+    import dashboard
+    from utils.database import create_habit, delete_habit, get_user_habits, list_habits_page
+
+    # Untimed setup for delete_habit: a habit with a full history to cascade over
+    def delete_with_history():
+        habit_id = create_habit(user_id, "To delete", "Other")
+        completions = database.get_completions_collection()
+        completions.insert_many([
+            {
+                "habit_id": ObjectId(habit_id),
+                "user_id": ObjectId(user_id),
+                "completion_date": datetime.combine(today - timedelta(days=d), datetime.min.time()),
+                "day": day_number(today - timedelta(days=d)),
+                "completed": True,
+            }
+            for d in range(days)
+        ])
+        return habit_id
+
+    # Alternate check/uncheck so every call really flips today's state
+    toggle_habit = str(get_user_habits(user_id)[0]["_id"])
+    toggle = itertools.cycle([True, False])
+
+    return {
+        "dashboard.show": lambda: dashboard.load_dashboard_data(user_id, today),
+        "checkin.show": lambda: checkin.load_checkin_data(user_id, today),
+        "checkin.mark_completion": lambda: checkin.mark_completion(
+            toggle_habit, user_id, today, next(toggle)
+        ),
+        "manage_habits.show": lambda: list_habits_page(user_id),
+        "create_habit": lambda: create_habit(user_id, "Benchmark habit", "Other"),
+        "delete_habit": (delete_with_history, lambda habit_id: delete_habit(habit_id, user_id)),
+        "login": lambda: authenticate_user(email, PASSWORD),
+    }
+
+
+def measure(operation, counter, repeat: int):
+    """Median latency (ms), round trips per call and peak memory (KiB)"""
+    if isinstance(operation, tuple):
+        setup, run = operation
+    else:
+        setup, run = (lambda: None), (lambda _: operation())
+
+    timings = []
+    trips = []
+    for _ in range(repeat):
+        arg = setup()
+        before = counter.count
+        start = time.perf_counter()
+        run(arg)
+        timings.append((time.perf_counter() - start) * 1000)
+        trips.append(counter.count - before)
+
+    # Separate run for memory, since tracing slows everything down
+    arg = setup()
+    tracemalloc.start()
+    run(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "min_ms": round(min(timings), 3),
+        "round_trips": max(trips),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run_scenario(name: str, habits: int, days: int, rate: float, counter, repeat: int):
+    db = database.get_database()
+    for collection in ("users", "habits", "completions", "migrations"):
+        db[collection].drop()
+
+    today = date.today()
+    start = time.perf_counter()
+    user_id, email = seed_user(db, habits, days, rate, today, hash_password(PASSWORD))
+    # Indexes go on after seeding, which is much faster than maintaining them per insert
+    ensure_indexes(db)
+    # Seeded completions already carry day numbers; this only marks them ready
+    add_day_numbers()
+    seed_seconds = time.perf_counter() - start
+    completions = db["completions"].count_documents({})
+    print(f"\n== {name}: {habits} habits x {days} days, {completions} completions "
+          f"(seeded in {seed_seconds:.1f}s)")
+
+    results = {}
+    for op_name, operation in build_operations(user_id, email, today, days).items():
+        results[op_name] = measure(operation, counter, repeat)
+        r = results[op_name]
+        print(f"  {op_name:<26} {r['median_ms']:>10.2f} ms  {r['round_trips']:>5} trips  {r['peak_kib']:>9.1f} KiB")
+
+    return {"habits": habits, "days": days, "completions": completions, "operations": results}
+
+
+def compare(results: dict, baseline_path: str):
+    """Print the change in median latency and round trips against a saved baseline"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit', 'unknown commit')}):")
+    for name, scenario in results["scenarios"].items():
+        old_scenario = baseline["scenarios"].get(name)
+        if not old_scenario:
+            continue
+        for op_name, r in scenario["operations"].items():
+            old = old_scenario["operations"].get(op_name)
+            if not old:
+                continue
+            change = (r["median_ms"] - old["median_ms"]) / old["median_ms"] * 100 if old["median_ms"] else 0
+            trips = r["round_trips"] - old["round_trips"]
+            print(f"  {name}/{op_name:<26} {change:>+7.1f}% latency  {trips:>+5} trips")
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="MongoDB URI of a throwaway local mongod (default: mongomock)")
+    parser.add_argument("--full", action="store_true", help="also run the large scenarios")
+    parser.add_argument("--scenario", action="append", help="run only the named scenario(s)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per operation")
+    parser.add_argument("--save", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="compare against a previously saved JSON baseline")
+    args = parser.parse_args()
+
+    scenarios = dict(SCENARIOS)
+    if args.full:
+        scenarios.update(FULL_SCENARIOS)
+    if args.scenario:
+        scenarios = {name: spec for name, spec in {**SCENARIOS, **FULL_SCENARIOS}.items() if name in args.scenario}
+
+    counter = setup_backend(args.uri)
+    results = {
+        "commit": current_commit(),
+        "backend": args.uri or "mongomock",
+        "python": sys.version.split()[0],
+        "scenarios": {},
+    }
+    for name, (habits, days, rate) in scenarios.items():
+        results["scenarios"][name] = run_scenario(name, habits, days, rate, counter, args.repeat)
+
+    database.close_client()
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Concurrent load test of the pages' data paths.
+
+Seeds a throwaway database with synthetic users, then runs N simulated
+sessions at once, for each N in a ramp. Every session replays what a
+user's visit does, through the same functions the pages call:
+
+    login           authenticate_user (bcrypt verify_password)
+    dashboard       dashboard.load_dashboard_data (status + streaks)
+    checkin         checkin.load_checkin_data
+    toggle          checkin.mark_completion, checking a habit then unchecking it
+    manage_habits   get_user_habits
+
+Each level reports throughput, p50/p95/p99 latency and the error rate, and
+marks the level where adding sessions stops adding throughput.
+
+    python -m benchmarks.load                               # mongomock, threads
+    python -m benchmarks.load --uri mongodb://localhost:27017 --levels 1,10,50,100,200
+    python -m benchmarks.load --uri mongodb://localhost:27017 --processes 4
+
+On mongomock all sessions share one in-process store, so the numbers mostly
+show Python-side contention (the GIL, bcrypt, locks). Use a real mongod via
+--uri to see how the database side scales. Process mode needs --uri.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+import argparse
+import json
+import os
+import random
+import time
+
+# Defaults for utils.database when no .env is present
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "habit_tracker_load")
+# Sessions use the read-through cache like the app does; --no-cache turns it off
+os.environ.setdefault("CACHE_ENABLED", "1")
+
+from utils import auth, cache, database
+from utils.auth import authenticate_user, hash_password
+from utils.indexes import ensure_indexes
+from utils.days import migrate as add_day_numbers
+from benchmarks.data_layer import PASSWORD, seed_user, setup_backend
+
+
+STEPS = ("login", "dashboard", "checkin", "toggle", "manage_habits")
+
+
+def seed(users: int, habits: int, days: int, rate: float, rounds: int, today: date):
+    """Seed `users` users and return [(user_id, email, habit_ids), ...]"""
+    db = database.get_database()
+    for collection in ("users", "habits", "completions", "migrations"):
+        db[collection].drop()
+
+    password_hash = hash_password(PASSWORD, rounds=rounds)
+    seeded = []
+    for _ in range(users):
+        user_id, email = seed_user(db, habits, days, rate, today, password_hash)
+        habit_ids = [str(h["_id"]) for h in db["habits"].find({"user_id": database.ObjectId(user_id)}, {"_id": 1})]
+        seeded.append((user_id, email, habit_ids))
+    ensure_indexes(db)
+    add_day_numbers()
+    return seeded
+
+
+def run_session(user, deadline: float, think: float, seed_value: int):
+    """
+    Replay visits for one session until the deadline.
+    Returns [(step, seconds, ok), ...].
+    """
+    # Page modules import streamlit, so load them only once a run starts
+    import checkin
+    import dashboard
+
+    user_id, email, habit_ids = user
+    rng = random.Random(seed_value)
+    session_state = {}
+    cache.bind_session(session_state)
+    today = date.today()
+    samples = []
+
+    def timed(step, call):
+        start = time.perf_counter()
+        try:
+            call()
+            ok = True
+        except Exception:
+            ok = False
+        samples.append((step, time.perf_counter() - start, ok))
+        if think:
+            time.sleep(rng.uniform(0, 2 * think))
+
+    while time.perf_counter() < deadline:
+        def login():
+            user_doc, error = authenticate_user(email, PASSWORD)
+            if error:
+                raise RuntimeError(error)
+
+        habit_id = rng.choice(habit_ids)
+        timed("login", login)
+        timed("dashboard", lambda: dashboard.load_dashboard_data(user_id, today))
+        timed("checkin", lambda: checkin.load_checkin_data(user_id, today))
+        timed("toggle", lambda: checkin.mark_completion(habit_id, user_id, today, True))
+        timed("toggle", lambda: checkin.mark_completion(habit_id, user_id, today, False))
+        timed("dashboard", lambda: dashboard.load_dashboard_data(user_id, today))
+        timed("manage_habits", lambda: database.get_user_habits(user_id))
+
+    return samples
+
+
+def run_sessions(users, sessions: int, duration: float, think: float, offset: int = 0):
+    """Run `sessions` concurrent sessions on threads; returns all their samples"""
+    deadline = time.perf_counter() + duration
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [
+            pool.submit(run_session, users[(offset + i) % len(users)], deadline, think, offset + i)
+            for i in range(sessions)
+        ]
+        samples = []
+        for future in futures:
+            samples.extend(future.result())
+    return samples
+
+
+def _process_worker(uri, users, sessions, duration, think, offset):
+    """Entry point of a worker process: its own client, its share of the sessions"""
+    database.close_client()
+    database.MONGODB_URI = uri
+    return run_sessions(users, sessions, duration, think, offset)
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+def summarize(samples, duration: float):
+    latencies = sorted(seconds for _, seconds, _ in samples)
+    errors = sum(1 for _, _, ok in samples if not ok)
+    flows = sum(1 for step, _, _ in samples if step == "login")
+    per_step = {}
+    for step in STEPS:
+        step_latencies = sorted(seconds for name, seconds, _ in samples if name == step)
+        per_step[step] = {
+            "count": len(step_latencies),
+            "p50_ms": _percentile(step_latencies, 0.50),
+            "p95_ms": _percentile(step_latencies, 0.95),
+            "p99_ms": _percentile(step_latencies, 0.99),
+        }
+    return {
+        "operations": len(samples),
+        "ops_per_s": len(samples) / duration,
+        "visits_per_s": flows / duration,
+        "p50_ms": _percentile(latencies, 0.50),
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99),
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "steps": per_step,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="MongoDB URI of a throwaway local mongod (default: mongomock)")
+    parser.add_argument("--levels", default="1,2,5,10,25,50",
+                        help="comma-separated concurrent session counts to ramp through")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level")
+    parser.add_argument("--think", type=float, default=0, help="mean pause between steps, seconds")
+    parser.add_argument("--processes", type=int, default=1, help="spread sessions over this many processes")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--habits", type=int, default=10)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--rate", type=float, default=0.7)
+    parser.add_argument("--rounds", type=int, default=None,
+                        help="bcrypt cost for seeded passwords and logins (default: BCRYPT_ROUNDS)")
+    parser.add_argument("--no-cache", action="store_true", help="disable the read-through cache")
+    parser.add_argument("--save", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.processes > 1 and not args.uri:
+        parser.error("--processes needs --uri: mongomock data is not shared between processes")
+    if args.no_cache:
+        cache.ENABLED = False
+    # Logins would otherwise rehash every seeded password to BCRYPT_ROUNDS
+    if args.rounds:
+        auth.BCRYPT_ROUNDS = args.rounds
+
+    levels = [int(level) for level in args.levels.split(",")]
+    setup_backend(args.uri)
+
+    today = date.today()
+    start = time.perf_counter()
+    users = seed(args.users, args.habits, args.days, args.rate, args.rounds, today)
+    print(f"Seeded {args.users} users x {args.habits} habits x {args.days} days "
+          f"in {time.perf_counter() - start:.1f}s ({args.uri or 'mongomock'}, "
+          f"{args.processes} process(es), cache {'off' if args.no_cache else 'on'})")
+
+    print(f"\n{'sessions':>8} {'visits/s':>9} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    results = []
+    best = 0.0
+    knee = None
+    for level in levels:
+        if args.processes > 1:
+            per_process = [level // args.processes + (1 if i < level % args.processes else 0)
+                           for i in range(args.processes)]
+            with ProcessPoolExecutor(max_workers=args.processes) as pool:
+                futures = [
+                    pool.submit(_process_worker, args.uri, users, count, args.duration, args.think,
+                                sum(per_process[:i]))
+                    for i, count in enumerate(per_process) if count
+                ]
+                samples = [sample for future in futures for sample in future.result()]
+        else:
+            samples = run_sessions(users, level, args.duration, args.think)
+
+        summary = summarize(samples, args.duration)
+        results.append({"sessions": level, **summary})
+        print(f"{level:>8} {summary['visits_per_s']:>9.1f} {summary['ops_per_s']:>8.1f} "
+              f"{summary['p50_ms'] or 0:>8.1f} {summary['p95_ms'] or 0:>8.1f} {summary['p99_ms'] or 0:>8.1f} "
+              f"{summary['error_rate']:>7.1%}")
+
+        # Scaling has stopped once more sessions add less than 10% throughput
+        if knee is None and best and summary["ops_per_s"] < best * 1.10:
+            knee = level
+        best = max(best, summary["ops_per_s"])
+
+    last = results[-1]
+    print(f"\nPer step at {last['sessions']} sessions (ms):")
+    for step, stats in last["steps"].items():
+        if stats["count"]:
+            print(f"  {step:<14} p50 {stats['p50_ms']:>8.1f}  p95 {stats['p95_ms']:>8.1f}  p99 {stats['p99_ms']:>8.1f}")
+
+    if knee is not None:
+        print(f"\nThroughput stops scaling at about {knee} concurrent sessions")
+    else:
+        print("\nThroughput was still scaling at the highest level tried")
+
+    database.close_client()
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"backend": args.uri or "mongomock", "levels": results}, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
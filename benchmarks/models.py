@@ -0,0 +1,169 @@
+"""
+Memory and decode time of habit and completion documents as raw dicts
+versus the slotted models in utils.models, without a database. Documents are BSON-encoded up
+front so decoding is measured the way the driver does it.
+
+    python -m benchmarks.models [--habits 10000] [--completions 100000] [--repeat 5]
+"""
+from datetime import datetime, timedelta
+import argparse
+import gc
+import os
+import statistics
+import time
+import tracemalloc
+
+# Defaults for utils.database when no .env is present
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "habit_tracker_bench")
+
+import bson
+from bson import ObjectId
+
+from utils.models import Habit, Completion, DASHBOARD_FIELDS
+
+
+def synthetic(habits: int):
+    """Full habit documents as stored by create_habit, BSON-encoded"""
+    user_id = ObjectId()
+    now = datetime.now()
+    categories = ["Health", "Productivity", "Finance", "Learning", "Fitness", "Mindfulness", "Other"]
+    return [
+        bson.encode({
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "name": f"Habit {i}",
+            "name_key": f"habit {i}",
+            "category": categories[i % len(categories)],
+            "description": "Something worth doing every day, written out at some length",
+            "start_date": now - timedelta(days=i % 365),
+            "created_at": now - timedelta(days=i % 365),
+            "current_streak": i % 30,
+            "longest_streak": i % 90,
+            "last_completed_date": now - timedelta(days=i % 3),
+            "total_completions": i % 365,
+        })
+        for i in range(habits)
+    ]
+
+
+def synthetic_completions(completions: int, habits: int = 100):
+    """Full completion documents as stored by mark_completion, BSON-encoded"""
+    user_id = ObjectId()
+    habit_ids = [ObjectId() for _ in range(habits)]
+    now = datetime.now()
+    today = datetime.combine(now.date(), datetime.min.time())
+    docs = []
+    for i in range(completions):
+        day = today - timedelta(days=i // habits)
+        docs.append(bson.encode({
+            "_id": ObjectId(),
+            "habit_id": habit_ids[i % habits],
+            "user_id": user_id,
+            "completion_date": day,
+            "day": (day.date() - datetime(1970, 1, 1).date()).days,
+            "completed": True,
+            "note": "",
+            "logged_at": now,
+            "updated_at": now,
+        }))
+    return docs
+
+
+# Fields a page reads from a completion
+COMPLETION_FIELDS = ("habit_id", "day", "completed", "note")
+
+
+def project(raw: bytes, fields) -> bytes:
+    """What the server would send back for a projected find"""
+    doc = bson.decode(raw)
+    return bson.encode({"_id": doc["_id"], **{f: doc[f] for f in fields if f in doc}})
+
+
+# How each variant turns the server's bytes into what a page holds on to
+VARIANTS = {
+    "dicts (all fields)": ("full", lambda docs: [bson.decode(d) for d in docs]),
+    "dicts (projected)": ("projected", lambda docs: [bson.decode(d) for d in docs]),
+    "Habit models": ("projected", lambda docs: [Habit.from_doc(bson.decode(d)) for d in docs]),
+}
+
+COMPLETION_VARIANTS = {
+    "dicts (all fields)": ("full", lambda docs: [bson.decode(d) for d in docs]),
+    "dicts (projected)": ("projected", lambda docs: [bson.decode(d) for d in docs]),
+    "Completion models": ("projected", lambda docs: [Completion.from_doc(bson.decode(d)) for d in docs]),
+}
+
+
+def retained_kib(build, docs):
+    """Memory still held by the result of build(docs), in KiB"""
+    gc.collect()
+    tracemalloc.start()
+    result = build(docs)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size / 1024
+
+
+def decode_ms(build, docs, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        build(docs)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings)
+
+
+def id_loop_ms(items, repeat: int, field: str = "_id"):
+    """The per-row id conversions a page does: str for keys, ObjectId for queries"""
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        if isinstance(items[0], dict):
+            for item in items:
+                key = str(item[field])
+                ObjectId(key)
+        elif isinstance(items[0], Habit):
+            for item in items:
+                key = item.id
+                item.oid
+        else:
+            for item in items:
+                key = item.habit_id
+                item.habit_oid
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings)
+
+
+def report(variants, docs, count: int, unit: str, repeat: int, field: str = "_id"):
+    print(f"{'variant':<20} {'decode ms':>10} {'ids ms':>8} {'retained KiB':>13} {f'bytes/{unit}':>12}")
+    for name, (source, build) in variants.items():
+        decode = decode_ms(build, docs[source], repeat)
+        ids = id_loop_ms(build(docs[source]), repeat, field)
+        kib = retained_kib(build, docs[source])
+        print(f"{name:<20} {decode:>10.1f} {ids:>8.1f} {kib:>13.0f} {kib * 1024 / count:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=10000)
+    parser.add_argument("--completions", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = {"full": synthetic(args.habits)}
+    docs["projected"] = [project(d, DASHBOARD_FIELDS) for d in docs["full"]]
+
+    print(f"{args.habits} habits, dashboard projection")
+    report(VARIANTS, docs, args.habits, "habit", args.repeat)
+
+    docs = {"full": synthetic_completions(args.completions)}
+    docs["projected"] = [project(d, COMPLETION_FIELDS) for d in docs["full"]]
+
+    print(f"\n{args.completions} completions, check-in projection")
+    report(COMPLETION_VARIANTS, docs, args.completions, "row", args.repeat, field="habit_id")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Hashes per second at each bcrypt cost, single-threaded and through the
+bounded worker pool in utils.auth.
+
+    python -m benchmarks.password_hashing [--min 10] [--max 14] [--seconds 2]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import time
+
+import bcrypt
+
+from utils.auth import BCRYPT_ROUNDS, BCRYPT_WORKERS, hash_password
+
+
+def measure(rounds: int, seconds: float, pooled: bool = False):
+    """Hash for roughly `seconds` and return hashes per second"""
+    password = b"correct horse battery staple"
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+
+    if not pooled:
+        while time.perf_counter() < deadline:
+            bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+            count += 1
+    else:
+        # Enough callers to keep every bcrypt worker busy
+        workers = BCRYPT_WORKERS * 2
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while time.perf_counter() < deadline:
+                list(pool.map(lambda _: hash_password(password.decode(), rounds), range(workers)))
+                count += workers
+
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min", type=int, default=10, help="lowest cost to test")
+    parser.add_argument("--max", type=int, default=14, help="highest cost to test")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time spent per cost")
+    args = parser.parse_args()
+
+    print(f"Configured cost: {BCRYPT_ROUNDS}, worker pool size: {BCRYPT_WORKERS}")
+    print(f"{'cost':>4}  {'ms/hash':>9}  {'hashes/s':>9}  {'pool hashes/s':>13}")
+    for rounds in range(args.min, args.max + 1):
+        single = measure(rounds, args.seconds)
+        pooled = measure(rounds, args.seconds, pooled=True)
+        marker = "  <- configured" if rounds == BCRYPT_ROUNDS else ""
+        print(f"{rounds:>4}  {1000 / single:>9.1f}  {single:>9.1f}  {pooled:>13.1f}{marker}")
+
+
+if __name__ == "__main__":
+    main()
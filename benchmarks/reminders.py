@@ -0,0 +1,150 @@
+"""
+One reminder tick over many due habits.
+
+Seeds users whose habits are all due, with a share of them done today, a
+share on a streak that is at risk and a share belonging to deleted accounts, then times Scheduler.tick: habits per
+second, notifications recorded and the peak Python memory above the
+baseline, which stays bounded by the heap and batch sizes rather than the
+habit count. A second tick shows what a tick with nothing due costs.
+The run fails if any live habit is still due after the first tick, e.g.
+because deleted habits crowded the heap.
+
+    python -m benchmarks.reminders                         # 20k habits on mongomock
+    python -m benchmarks.reminders --uri mongodb://localhost:27017 --habits 1000000
+
+On mongomock every query scans the whole collection, so large runs need a
+real mongod.
+"""
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# Defaults for utils.database when no .env is present
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "habit_tracker_bench")
+
+from bson import ObjectId
+
+from utils import database, reminders
+from utils.days import day_number, local_today, MIGRATION_ID
+from utils.indexes import ensure_indexes
+from benchmarks.data_layer import setup_backend
+
+
+def seed(habits: int, per_user: int, done_rate: float, risk_rate: float, deleted_rate: float = 0.0,
+         chunk: int = 10000):
+    """Insert users and due habits; returns the number of completions written"""
+    db = database.get_database()
+    for collection in ("users", "habits", "completions", "notifications", "migrations"):
+        db[collection].drop()
+    db["migrations"].insert_one({"_id": MIGRATION_ID, "finished_at": datetime.now()})
+
+    rng = random.Random(habits)
+    today = local_today()
+    today_dt = datetime.combine(today, datetime.min.time())
+    yesterday = today_dt - timedelta(days=1)
+    users, docs, completions = [], [], []
+    written = 0
+    user_id = None
+    deleted_at = None
+
+    def flush():
+        nonlocal users, docs, completions, written
+        if users:
+            db["users"].insert_many(users, ordered=False)
+        if docs:
+            db["habits"].insert_many(docs, ordered=False)
+        if completions:
+            db["completions"].insert_many(completions, ordered=False)
+            written += len(completions)
+        users, docs, completions = [], [], []
+
+    for i in range(habits):
+        if i % per_user == 0:
+            user_id = ObjectId()
+            deleted_at = today_dt if rng.random() < deleted_rate else None
+            user = {"_id": user_id, "name": "Benchmark User", "email": f"bench-{user_id}@example.com"}
+            if deleted_at:
+                user["deleted_at"] = deleted_at
+            users.append(user)
+        habit_id = ObjectId()
+        at_risk = rng.random() < risk_rate
+        doc = {
+            "_id": habit_id,
+            "user_id": user_id,
+            "name": f"Habit {i}",
+            "start_date": today_dt - timedelta(days=30),
+            "current_streak": 5 if at_risk else 0,
+            "last_completed_date": yesterday if at_risk else None,
+            # Accounts deleted before delete_account dropped next_due still carry it
+            "next_due": database.DUE_NOW,
+        }
+        if deleted_at:
+            doc["deleted_at"] = deleted_at
+        docs.append(doc)
+        if rng.random() < done_rate:
+            completions.append({
+                "habit_id": habit_id, "user_id": user_id, "completion_date": today_dt,
+                "day": day_number(today), "completed": True,
+            })
+        if len(docs) >= chunk:
+            flush()
+    flush()
+    ensure_indexes(db)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", help="MongoDB URI of a throwaway local mongod (default: mongomock)")
+    parser.add_argument("--habits", type=int, default=20000)
+    parser.add_argument("--per-user", type=int, default=10, help="habits per user")
+    parser.add_argument("--done-rate", type=float, default=0.5, help="share of habits done today")
+    parser.add_argument("--risk-rate", type=float, default=0.3, help="share of habits with a streak at risk")
+    parser.add_argument("--deleted-rate", type=float, default=0.1,
+                        help="share of users whose account is deleted but not purged yet")
+    parser.add_argument("--batch-size", type=int, default=reminders.BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=reminders.WORKERS)
+    parser.add_argument("--heap-size", type=int, default=reminders.HEAP_SIZE)
+    args = parser.parse_args()
+
+    setup_backend(args.uri)
+    # Every habit has passed its reminder time, whatever the server's clock says
+    reminders.REMINDER_TIME = "00:00"
+
+    start = time.perf_counter()
+    completions = seed(args.habits, args.per_user, args.done_rate, args.risk_rate, args.deleted_rate)
+    print(f"Seeded {args.habits} due habits, {completions} done today, "
+          f"in {time.perf_counter() - start:.1f}s ({args.uri or 'mongomock'})")
+
+    scheduler = reminders.Scheduler(args.workers, args.batch_size, args.heap_size, sinks=[])
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    processed, notified = scheduler.tick()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    left = database.get_habits_collection().count_documents(
+        {"next_due": {"$lte": reminders._utc_now()}, **database.NOT_DELETED}
+    )
+    print(f"\nTick: {processed} habits in {elapsed:.2f}s ({processed / elapsed:,.0f} habits/s), "
+          f"{notified} notifications, peak {peak / 1024 / 1024:.1f} MiB above baseline")
+    print(f"      batch {args.batch_size}, {args.workers} workers, heap {args.heap_size}; "
+          f"{left} live habit(s) still due")
+
+    start = time.perf_counter()
+    processed, _ = scheduler.tick()
+    print(f"Idle tick: {processed} habits in {(time.perf_counter() - start) * 1000:.1f} ms")
+    database.close_client()
+    return 1 if left else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Cold-start cost: import time of each app module in a fresh interpreter,
+measured with python -X importtime.
+
+    python -m benchmarks.startup [--top 15] [--repeat 3] [--save startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What a fresh worker imports to serve the login page, then each page on first visit
+MODULES = ["home", "utils.database", "utils.auth", "signup", "checkin", "manage_habits", "dashboard"]
+
+
+def import_times(module: str):
+    """
+    Import `module` in a new interpreter. Returns (cumulative microseconds for
+    the module itself, {imported module: cumulative microseconds}).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip()}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if not parts[0].isdigit():
+            continue
+        name = parts[2].strip()
+        times[name] = int(parts[1])
+    return times.get(module, 0), times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="heaviest dependencies of home to list")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per module")
+    parser.add_argument("--save", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'module':<16} {'import ms':>10}")
+    for module in MODULES:
+        try:
+            samples = [import_times(module)[0] for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{module:<16} {'failed':>10}  ({str(e).splitlines()[-1]})")
+            continue
+        results[module] = round(statistics.median(samples) / 1000, 1)
+        print(f"{module:<16} {results[module]:>10.1f}")
+
+    _, home_deps = import_times("home")
+    top_level = {name: us for name, us in home_deps.items() if "." not in name}
+    print("\nHeaviest top-level imports behind home (ms):")
+    for name, us in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<24} {us / 1000:>8.1f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"modules_ms": results, "home_dependencies_ms": {k: v / 1000 for k, v in top_level.items()}}, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
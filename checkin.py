@@ -1,53 +1,180 @@
 import streamlit as st
-from utils.database import get_user_habits, get_completions_collection
+from utils.database import (
+    get_completions_collection, get_completion_buckets_collection,
+    get_completed_dates, get_user_today, use_buckets
+)
+from utils.models import load_checkin_habits, load_completions
+from utils.streaks import apply_completion_change, apply_completion_changes
+from utils.buckets import mark_day, bucket_update
+from utils.days import day_number, midnight
+from utils import cache, write_behind
 from bson import ObjectId
-from datetime import datetime, date, time
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime, date, timedelta
 
 
-def is_completed_today(habit_id: str, check_date: date):
-    """Check if habit was completed on specific date"""
-    completions = get_completions_collection()
-    
-    # ✅ Convert date to datetime for MongoDB query
-    if isinstance(check_date, date) and not isinstance(check_date, datetime):
-        check_date = datetime.combine(check_date, time.min)
-    
-    record = completions.find_one({
-        "habit_id": ObjectId(habit_id),
-        "completion_date": check_date,
-        "completed": True
-    })
-    return record is not None
+# Days before today that batch mode can back-fill
+MAX_BACKFILL_DAYS = 13
 
 
 def mark_completion(habit_id: str, user_id: str, completion_date: date, completed: bool, note: str = ""):
     """Mark habit as complete or incomplete for a specific date"""
+    try:
+        _write_completion(habit_id, user_id, completion_date, completed, note)
+    finally:
+        # Today's status and the streak counters may both have changed
+        cache.invalidate(user_id, "status", "habits")
+
+
+def _write_completion(habit_id: str, user_id: str, completion_date: date, completed: bool, note: str):
+    # Stored as the naive midnight of the day, plus its day number
+    completion_date = midnight(completion_date)
+    
+    if write_behind.ENABLED:
+        # Durable locally right away; the flusher writes it to MongoDB
+        write_behind.enqueue(habit_id, user_id, completion_date, completed, note)
+        return
+    
+    if use_buckets():
+        # One $bit upsert on the habit's month bucket
+        was_completed = mark_day(habit_id, user_id, completion_date, completed, note)
+        if was_completed != completed:
+            apply_completion_change(habit_id, completion_date, completed)
+        return
+    
     completions = get_completions_collection()
     
-    # ✅ Convert date to datetime for MongoDB
-    if isinstance(completion_date, date) and not isinstance(completion_date, datetime):
-        completion_date = datetime.combine(completion_date, time.min)
+    # Single atomic upsert keyed on the unique (habit_id, completion_date) index.
+    # The previous version of the record tells us whether the day actually flipped.
+    previous = completions.find_one_and_update(
+        {"habit_id": ObjectId(habit_id), "completion_date": completion_date},
+        {
+            "$set": {
+                "completed": completed, "note": note, "logged_at": datetime.now(),
+                "updated_at": datetime.now(), "day": day_number(completion_date)
+            },
+            "$setOnInsert": {"user_id": ObjectId(user_id)}
+        },
+        projection={"_id": 0, "completed": 1},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
     
-    # Check if completion already exists
-    existing = completions.find_one({
-        "habit_id": ObjectId(habit_id),
-        "completion_date": completion_date
-    })
+    was_completed = bool(previous and previous.get("completed"))
+    if was_completed != completed:
+        apply_completion_change(habit_id, completion_date, completed)
+
+
+def mark_completions(user_id: str, changes: list):
+    """
+    Apply many staged check-ins with one unordered bulk_write of upserts.
+
+    Each change is {"habit_id", "date", "completed", "expected"}, where
+    expected is the state the user saw when staging it. A day that changed
+    state in the meantime makes its upsert hit the unique index; it is
+    reported as a conflict and left as it is.
+    Returns {"applied": [...], "conflicts": [...], "failed": [(change, error), ...]}.
+    """
+    report = {"applied": [], "conflicts": [], "failed": []}
+    if not changes:
+        return report
+
+    if write_behind.ENABLED:
+        # Through the queue, so a check-in still queued for the same day cannot overwrite the batch
+        _enqueue_completions(user_id, changes, report)
+        cache.invalidate(user_id, "status", "habits")
+        return report
+
+    buckets = use_buckets()
+    now = datetime.now()
+    operations = []
+    for change in changes:
+        day = midnight(change["date"])
+        if buckets:
+            query, update = bucket_update(
+                change["habit_id"], user_id, day, change["completed"], change.get("note", ""), now,
+                expected=change["expected"]
+            )
+        else:
+            query = {
+                "habit_id": ObjectId(change["habit_id"]),
+                "completion_date": day,
+                "completed": True if change["expected"] else {"$ne": True},
+            }
+            update = {
+                "$set": {
+                    "completed": change["completed"], "note": change.get("note", ""), "logged_at": now,
+                    "updated_at": now, "day": day_number(day)
+                },
+                "$setOnInsert": {"user_id": ObjectId(user_id)}
+            }
+        operations.append(UpdateOne(query, update, upsert=True))
+
+    collection = get_completion_buckets_collection() if buckets else get_completions_collection()
+    errors = {}
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+    except Exception as e:
+        report["failed"] = [(change, str(e)) for change in changes]
+        return report
+
+    for index, change in enumerate(changes):
+        error = errors.get(index)
+        if error is None:
+            report["applied"].append(change)
+        elif error.get("code") == 11000:
+            report["conflicts"].append(change)
+        else:
+            report["failed"].append((change, error.get("errmsg", "write failed")))
+
+    apply_completion_changes(
+        (change["habit_id"], change["date"], change["completed"]) for change in report["applied"]
+    )
+    cache.invalidate(user_id, "status", "habits")
+
+    return report
+
+
+def _enqueue_completions(user_id: str, changes: list, report: dict):
+    """
+    Queue batch changes for the write-behind flusher. The expected state is
+    checked against MongoDB plus what is already queued, as the page showed it.
+    """
+    days = [change["date"] for change in changes]
+    completed = get_completed_dates(user_id, min(days), max(days), {change["habit_id"] for change in changes})
+    queued = write_behind.pending_changes(user_id, min(days), max(days))
+
+    for change in changes:
+        key = (change["habit_id"], change["date"])
+        current = queued.get(key, change["date"] in completed.get(change["habit_id"], ()))
+        if current != bool(change["expected"]):
+            report["conflicts"].append(change)
+            continue
+        try:
+            write_behind.enqueue(change["habit_id"], user_id, change["date"], change["completed"], change.get("note", ""))
+            report["applied"].append(change)
+        except Exception as e:
+            report["failed"].append((change, str(e)))
+
+
+def load_checkin_data(user_id: str, today: date):
+    """
+    Fetch habits and today's status for each of them, plus the ids of habits
+    whose check-in is still queued for writing and of those that failed to save
+    """
+    habits = load_checkin_habits(user_id)
+    if not habits:
+        return habits, {}, set(), set()
     
-    if existing:
-        completions.update_one(
-            {"_id": existing["_id"]},
-            {"$set": {"completed": completed, "note": note, "logged_at": datetime.now()}}
-        )
-    else:
-        completions.insert_one({
-            "habit_id": ObjectId(habit_id),
-            "user_id": ObjectId(user_id),
-            "completion_date": completion_date,
-            "completed": completed,
-            "note": note,
-            "logged_at": datetime.now()
-        })
+    # Today's status for every habit in a single query
+    status = {h.id: False for h in habits}
+    for completion in load_completions(user_id, status, today, today):
+        status[completion.habit_id] = True
+    status, saving = write_behind.overlay_status(user_id, status, today)
+    return habits, status, saving, write_behind.failed_habits(user_id, today)
 
 
 def show():
@@ -56,20 +183,25 @@ def show():
         return
     
     st.title("📅 Today's Check-In")
-    today = date.today()
+    today = get_user_today(st.session_state["user_id"])
     st.subheader(today.strftime("%A, %B %d, %Y"))
     
-    habits = get_user_habits(st.session_state["user_id"])
+    habits, status, saving, failed = load_checkin_data(st.session_state["user_id"], today)
     
     if not habits:
         st.info("You don't have any habits yet. Create one in the 'My Habits' page!")
         return
     
+    if st.toggle("Batch check-in", key="batch_checkin",
+                 help="Tick several habits and past days, then save them all at once"):
+        show_batch_checkin(st.session_state["user_id"], habits, today)
+        return
+    
     completed_count = 0
     
     for habit in habits:
-        habit_id = str(habit['_id'])
-        is_done = is_completed_today(habit_id, today)
+        habit_id = habit.id
+        is_done = status[habit_id]
         
         if is_done:
             completed_count += 1
@@ -77,7 +209,11 @@ def show():
         col1, col2 = st.columns([3, 1])
         
         with col1:
-            st.write(f"**{habit['name']}** ({habit['category']})")
+            st.write(f"**{habit.name}** ({habit.category})")
+            if habit_id in saving:
+                st.caption("⏳ Saving…")
+            elif habit_id in failed:
+                st.caption("❌ Your last check-in could not be saved. Please set it again.")
         
         with col2:
             checked = st.checkbox("✓ Done", value=is_done, key=f"check_{habit_id}")
@@ -91,3 +227,66 @@ def show():
     progress = completed_count / total if total > 0 else 0
     st.progress(progress)
     st.write(f"**Progress:** {completed_count} out of {total} habits completed today ({int(progress * 100)}%)")
+
+
+def show_batch_checkin(user_id: str, habits: list, today: date):
+    """Stage check-ins for several habits and days, then save them in one write"""
+    report = st.session_state.pop("batch_checkin_report", None)
+    if report is not None:
+        show_batch_report(report, {h.id: h.name for h in habits})
+
+    backfill = st.slider("Days to back-fill", 0, MAX_BACKFILL_DAYS, 0, key="batch_backfill_days")
+    days = [today - timedelta(days=offset) for offset in range(backfill, -1, -1)]
+    completed = get_completed_dates(user_id, days[0], today, [h.id for h in habits])
+    if write_behind.ENABLED:
+        for (habit_id, day), done in write_behind.pending_changes(user_id, days[0], today).items():
+            if done:
+                completed.setdefault(habit_id, set()).add(day)
+            else:
+                completed.get(habit_id, set()).discard(day)
+
+    # Widgets inside a form do not rerun the page until it is submitted
+    with st.form("batch_checkin_form"):
+        header = st.columns([3] + [1] * len(days))
+        for col, day in zip(header[1:], days):
+            col.caption("Today" if day == today else day.strftime("%a %d"))
+
+        staged = {}
+        for habit in habits:
+            cols = st.columns([3] + [1] * len(days))
+            cols[0].write(f"**{habit.name}**")
+            for col, day in zip(cols[1:], days):
+                was_done = day in completed.get(habit.id, ())
+                checked = col.checkbox("Done", value=was_done, key=f"batch_{habit.id}_{day}",
+                                       label_visibility="collapsed")
+                staged[(habit.id, day)] = (was_done, checked)
+
+        submitted = st.form_submit_button("Save changes", type="primary")
+
+    if submitted:
+        changes = [
+            {"habit_id": habit_id, "date": day, "completed": checked, "expected": was_done}
+            for (habit_id, day), (was_done, checked) in staged.items()
+            if checked != was_done
+        ]
+        if not changes:
+            st.info("Nothing to save")
+            return
+        st.session_state["batch_checkin_report"] = mark_completions(user_id, changes)
+        st.rerun()
+
+
+def show_batch_report(report: dict, names: dict):
+    """Outcome of the last batch save"""
+    label = lambda change: f"{names.get(change['habit_id'], change['habit_id'])} on {change['date']:%a %d %b}"
+
+    if report["applied"]:
+        st.success(f"Saved {len(report['applied'])} change(s)")
+    if report["conflicts"]:
+        st.warning("These were changed elsewhere in the meantime and were left as they are:")
+        for change in report["conflicts"]:
+            st.caption(f"• {label(change)}")
+    if report["failed"]:
+        st.error("These could not be saved:")
+        for change, error in report["failed"]:
+            st.caption(f"• {label(change)}: {error}")
@@ -1,49 +1,132 @@
 import streamlit as st
-from utils.database import get_user_habits, get_completions_collection
-from bson import ObjectId
-from datetime import datetime, date, time, timedelta
+from utils.database import get_completion_status, get_user_today
+from utils.models import load_dashboard_habits
+from utils.streaks import get_user_streaks
+from utils.analytics import compute_history
+from utils.async_data import PageFetch
+from utils import shared_cache
+from datetime import date
+from functools import partial
 
 
-def is_completed_today(habit_id: str, check_date: date):
-    """Check if habit was completed on specific date"""
-    completions = get_completions_collection()
+HISTORY_PERIODS = [30, 90, 365, 730]
+COMPARISON_DAYS = 30
+
+
+def _shared(user_id: str, key: tuple, loader):
+    """A call that reads through the cache of dashboard aggregates shared by all workers"""
+    return partial(shared_cache.cached, user_id, key, loader)
+
+
+def dashboard_calls(user_id: str, habits: list, today: date):
+    """The queries behind the summary and the habit list, by name"""
+    habit_ids = [h.id for h in habits]
+    calls = {
+        "status": _shared(user_id, ("status", today, tuple(habit_ids)),
+                          partial(get_completion_status, user_id, habit_ids, today)),
+    }
+    # Habits that have not been backfilled with streak counters yet
+    missing = [h.id for h in habits if not h.has_counters]
+    if missing:
+        calls["streaks"] = _shared(user_id, ("streaks", today, tuple(missing)),
+                                   partial(get_user_streaks, user_id, habit_ids=missing, today=today))
+    return calls
+
+
+def assemble_dashboard(user_id: str, habits: list, today: date, values: dict):
+    """Today's status and current streaks from the fetched values; failed queries count as nothing done"""
+    from utils.write_behind import overlay_status
+    status, _ = overlay_status(user_id, values.get("status", {}), today)
     
-    # ✅ Convert date to datetime for MongoDB query
-    if isinstance(check_date, date) and not isinstance(check_date, datetime):
-        check_date = datetime.combine(check_date, time.min)
+    # Streaks come from the counters stored on each habit
+    streaks = {h.id: h.streak_on(today) if h.has_counters else 0 for h in habits}
+    computed = values.get("streaks", {})
+    streaks.update({habit_id: s['current_streak'] for habit_id, s in computed.items()})
+    return status, streaks
+
+
+def load_dashboard_data(user_id: str, today: date, page: PageFetch = None):
+    """Fetch habits, today's status and current streaks for the dashboard"""
+    page = page or PageFetch()
+    habits = load_dashboard_habits(user_id)
+    if not habits:
+        return habits, {}, {}
     
-    record = completions.find_one({
-        "habit_id": ObjectId(habit_id),
-        "completion_date": check_date,
-        "completed": True
-    })
-    return record is not None
+    values, _ = page.fetch(dashboard_calls(user_id, habits, today))
+    status, streaks = assemble_dashboard(user_id, habits, today, values)
+    return habits, status, streaks
 
 
-def calculate_current_streak(habit_id: str):
-    """Calculate current consecutive streak"""
-    completions = get_completions_collection()
-    today = date.today()
-    streak = 0
+def show_history(history: dict, mine: dict, everyone: dict):
+    """Heatmap, completion-rate trends and breakdowns for the last year"""
+    st.subheader("📈 History")
     
-    check_date = today
-    while True:
-        # ✅ Convert to datetime before querying MongoDB
-        check_date_dt = datetime.combine(check_date, time.min)
-        
-        record = completions.find_one({
-            "habit_id": ObjectId(habit_id),
-            "completion_date": check_date_dt,
-            "completed": True
-        })
-        
-        if record:
-            streak += 1
-            check_date -= timedelta(days=1)
-        else:
-            break
+    # Read before the fetch in show(); the default matches the session's first value
+    st.selectbox("Period", HISTORY_PERIODS, index=2,
+                 format_func=lambda d: f"Last {d} days", key="history_days")
+    if history is None:
+        st.warning("History is taking too long to load. Try again in a moment.")
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        rate = history["overall_rate"]
+        st.metric("Completion Rate", "—" if rate != rate else f"{rate:.0%}")
+    with col2:
+        st.metric("Best Weekday", history["best_weekday"] or "—")
+    
+    # Calendar heatmap: one column per week, one row per weekday
+    import altair as alt
+    chart = alt.Chart(history["heatmap"]).mark_rect().encode(
+        x=alt.X("week:O", axis=None),
+        y=alt.Y("weekday:O", sort=["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"], title=None),
+        color=alt.Color("completed:Q", scale=alt.Scale(scheme="greens"), title="Habits done"),
+        tooltip=[alt.Tooltip("day:T"), "completed:Q"]
+    )
+    st.altair_chart(chart, use_container_width=True)
+    
+    show_category_comparison(mine, everyone)
     
-    return streak
+    st.caption("Rolling completion rate")
+    st.line_chart(history["rolling"])
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.caption("By category")
+        st.bar_chart(history["categories"])
+    with col2:
+        st.caption("By weekday")
+        st.bar_chart(history["weekdays"])
+
+
+def show_category_comparison(mine: dict, everyone: dict, days: int = COMPARISON_DAYS):
+    """Your completion rate per category next to everyone's, from the daily rollups"""
+    if not mine:
+        return
+    
+    st.caption(f"Your categories vs all users, last {days} days")
+    st.dataframe(
+        [
+            {
+                "category": category,
+                "you": "—" if rate is None else f"{rate:.0%}",
+                "everyone": "—" if everyone.get(category) is None else f"{everyone[category]:.0%}",
+            }
+            for category, rate in sorted(mine.items())
+        ],
+        use_container_width=True,
+        hide_index=True
+    )
+
+
+def show_inbox(user_id: str, notifications: list):
+    """Unread reminders and streak-at-risk notices"""
+    for notification in notifications:
+        st.info(notification["message"])
+    if st.button("Mark all as read", key="inbox_read"):
+        from utils.reminders import mark_read
+        mark_read(user_id)
+        st.rerun()
 
 
 def show():
@@ -54,12 +137,42 @@ def show():
     st.title("🎯 Habit Tracker Dashboard")
     st.write(f"Welcome back, {st.session_state.get('user_name', 'User')}!")
     
-    habits = get_user_habits(st.session_state["user_id"])
+    # Loaded with the dashboard's data rather than with the module
+    from utils.reminders import get_notifications
+    from utils.rollups import get_user_category_rates, get_category_rates
+    
+    user_id = st.session_state["user_id"]
+    page = PageFetch()
+    
+    # The user's today and habit list first: every other query needs them
+    values, errors = page.fetch({
+        "today": partial(get_user_today, user_id),
+        "habits": partial(load_dashboard_habits, user_id),
+        "inbox": partial(get_notifications, user_id, limit=5),
+    })
+    if "today" in errors or "habits" in errors:
+        st.error("Could not load your habits. Please try again.")
+        return
+    today, habits = values["today"], values["habits"]
+    
+    if values.get("inbox"):
+        show_inbox(user_id, values["inbox"])
     
     if not habits:
         st.info("Start your journey by creating your first habit!")
         return
     
+    # Then everything else on the page at once
+    days = st.session_state.get("history_days", HISTORY_PERIODS[2])
+    values, _ = page.fetch({
+        **dashboard_calls(user_id, habits, today),
+        "history": _shared(user_id, ("history", today, days),
+                           partial(compute_history, user_id, habits, days=days, today=today)),
+        "mine": partial(get_user_category_rates, user_id, days=COMPARISON_DAYS, today=today),
+        "everyone": partial(get_category_rates, days=COMPARISON_DAYS, today=today),
+    })
+    status, streaks = assemble_dashboard(user_id, habits, today, values)
+    
     # Summary statistics
     col1, col2, col3 = st.columns(3)
     
@@ -67,26 +180,25 @@ def show():
         st.metric("Total Habits", len(habits))
     
     with col2:
-        today = date.today()
-        completed_today = sum(1 for h in habits if is_completed_today(str(h['_id']), today))
+        completed_today = sum(1 for done in status.values() if done)
         st.metric("Completed Today", f"{completed_today}/{len(habits)}")
     
     with col3:
-        active_streaks = sum(1 for h in habits if calculate_current_streak(str(h['_id'])) > 0)
+        active_streaks = sum(1 for streak in streaks.values() if streak > 0)
         st.metric("Active Streaks", active_streaks)
     
     # Habit list with streaks
     st.subheader("Your Habits")
     
     for habit in habits:
-        streak = calculate_current_streak(str(habit['_id']))
+        streak = streaks[habit.id]
         
         with st.container():
             col1, col2 = st.columns([4, 1])
             
             with col1:
-                st.write(f"**{habit['name']}**")
-                st.caption(f"{habit['category']}")
+                st.write(f"**{habit.name}**")
+                st.caption(f"{habit.category}")
             
             with col2:
                 if streak > 0:
@@ -95,3 +207,5 @@ def show():
                     st.write("—")
             
             st.divider()
+    
+    show_history(values.get("history"), values.get("mine", {}), values.get("everyone", {}))
@@ -1,10 +1,9 @@
 import streamlit as st
-import signup
-import dashboard
-import manage_habits
-import checkin
-from utils.auth import verify_password
-from utils.database import get_users_collection
+from utils.pages import show_page
+from utils.cache import bind_session
+from utils.instrumentation import page_timer, get_stats, get_recent_reruns, dump_stats, reset_stats
+from utils.instrumentation import ENABLED as INSTRUMENTATION_ENABLED
+import os
 
 
 def show_login():
@@ -23,15 +22,12 @@ def show_login():
                 st.error("Please fill in all fields")
                 return
             
-            users_collection = get_users_collection()
-            user = users_collection.find_one({"email": email})
+            # bcrypt and pymongo load on the first login, not with the login page
+            from utils.auth import authenticate_user
+            user, error = authenticate_user(email, password)
             
-            if not user:
-                st.error("Email not registered.")
-                return
-            
-            if not verify_password(password, user["password"]):
-                st.error("Invalid password.")
+            if error:
+                st.error(error)
                 return
             
             # Store logged in state
@@ -49,9 +45,131 @@ def show_login():
             st.rerun()
 
 
+def _enabled(setting: str) -> bool:
+    return os.getenv(setting, "0") in ("1", "true", "True")
+
+
+@st.cache_resource
+def start_background_workers():
+    """
+    Start the purge worker, and the check-in flusher, rollups and reminders if
+    enabled, once per process. Runs after login, so a cold worker serving the
+    login page neither connects nor loads these modules. Indexes and backfills
+    are a deploy step: python -m utils.deploy.
+    """
+    if _enabled("CHECKIN_WRITE_BEHIND"):
+        from utils import write_behind
+        write_behind.start_flusher()
+    if _enabled("ROLLUP_SCHEDULER"):
+        from utils import rollups
+        rollups.start_scheduler()
+    if _enabled("REMINDER_SCHEDULER"):
+        from utils import reminders
+        reminders.start_scheduler()
+    from utils.days import start_migration
+    from utils.deletion import start_worker
+    from utils.indexes import start_index_check
+    # Only warns: building indexes is left to python -m utils.deploy
+    start_index_check()
+    # Adds day numbers to older completions; reads switch over once it is done
+    start_migration()
+    return start_worker()
+
+
+@st.cache_resource
+def timezone_choices():
+    from zoneinfo import available_timezones
+    return ["Server time"] + sorted(available_timezones())
+
+
+def show_profile():
+    from utils.database import delete_account, get_user_profile, set_user_timezone
+    
+    profile = get_user_profile(st.session_state["user_id"])
+    if profile:
+        st.write(f"**Name:** {profile['name']}")
+        st.write(f"**Email:** {profile['email']}")
+        
+        # Which calendar day a check-in counts for
+        zones = timezone_choices()
+        current = profile.get("timezone") or "Server time"
+        timezone = st.selectbox("Timezone", zones, index=zones.index(current) if current in zones else 0)
+        if timezone != current and st.button("Save timezone"):
+            set_user_timezone(st.session_state["user_id"], "" if timezone == "Server time" else timezone)
+            st.success("Timezone updated!")
+            st.rerun()
+    
+    st.divider()
+    st.subheader("Delete Account")
+    st.caption("This removes your account, habits and history. It cannot be undone.")
+    
+    confirm = st.checkbox("I understand, delete my account", key="confirm_delete_account")
+    if st.button("Delete Account", disabled=not confirm):
+        # The account disappears now; its data is purged in the background
+        delete_account(st.session_state["user_id"])
+        for key in list(st.session_state.keys()):
+            del st.session_state[key]
+        st.rerun()
+
+
+def perf_panel_allowed():
+    """PERF_PANEL=1 enables the panel for everyone, or list admin emails; needs PERF_INSTRUMENTATION=1"""
+    if not INSTRUMENTATION_ENABLED:
+        return False
+    setting = os.getenv("PERF_PANEL", "")
+    if setting == "1":
+        return True
+    admins = {email.strip() for email in setting.split(",") if email.strip()}
+    return st.session_state.get("user_email") in admins
+
+
+def show_perf_panel(page: str):
+    """Sidebar panel with the last rerun's queries and aggregated percentiles"""
+    with st.sidebar.expander("⏱️ Performance", expanded=True):
+        reruns = get_recent_reruns(page)
+        if reruns:
+            last = reruns[-1]
+            st.caption(f"Last {page} rerun: {last['wall_ms']:.0f} ms wall, "
+                       f"{last['round_trips']} round trips, {last['db_ms']:.1f} ms in MongoDB, "
+                       f"{last['documents']} documents")
+            st.dataframe(
+                [{"caller": caller, **values} for caller, values in last["callers"].items()],
+                use_container_width=True
+            )
+        
+        st.caption("Percentiles (ms)")
+        st.dataframe(
+            [
+                {
+                    "page": row["page"],
+                    "caller": row["caller"] or "(whole page)",
+                    "reruns": row["reruns"],
+                    "round trips": row["round_trips"],
+                    "db p50": row["db_ms"]["p50"],
+                    "db p95": row["db_ms"]["p95"],
+                    "wall p95": (row["wall_ms"] or {}).get("p95"),
+                }
+                for row in get_stats()
+            ],
+            use_container_width=True
+        )
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Dump stats"):
+                st.caption(f"Written to {dump_stats()}")
+        with col2:
+            if st.button("Reset"):
+                reset_stats()
+
+
 def main():
+    bind_session(st.session_state)
+    
     # Check if user is logged in
     if st.session_state.get("logged_in", False):
+        start_background_workers()
+        
         # Show sidebar navigation for logged in users
         st.sidebar.title("Navigation")
         
@@ -67,23 +185,28 @@ def main():
                 del st.session_state[key]
             st.rerun()
         
+        show_panel = perf_panel_allowed() and st.sidebar.checkbox("Show performance panel", key="perf_panel")
+        
         # Route to appropriate page
-        if page == "Dashboard":
-            dashboard.show()
-        elif page == "Today's Check-In":
-            checkin.show()
-        elif page == "My Habits":
-            manage_habits.show()
-        elif page == "Profile":
-            st.write("Profile page coming soon!")
+        with page_timer(page):
+            if page == "Profile":
+                show_profile()
+            else:
+                # Page modules are imported on first visit
+                show_page(page)
+        
+        if show_panel:
+            show_perf_panel(page)
     
     elif st.session_state.get("show_signup", False):
         # Show signup page
-        signup.show()
+        with page_timer("Sign Up"):
+            show_page("Sign Up")
     
     else:
         # Show login page (home)
-        show_login()
+        with page_timer("Login"):
+            show_login()
 
 
 if __name__ == "__main__":
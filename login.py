@@ -1,6 +1,5 @@
 import streamlit as st
-from utils.auth import verify_password, create_user 
-from utils.database import get_users_collection
+from utils.auth import authenticate_user, create_user
 
 
 def show():
@@ -14,15 +13,10 @@ def show():
     password = st.text_input("Password", type="password")
 
     if st.button("Login"):
-        users_collection = get_users_collection()
-        user = users_collection.find_one({"email": email})
+        user, error = authenticate_user(email, password)
 
-        if not user:
-            st.error("Email not registered.")
-            return
-
-        if not verify_password(password, user["password"]):
-            st.error("Invalid password.")
+        if error:
+            st.error(error)
             return
 
         # Store logged in state
@@ -1,6 +1,9 @@
 import streamlit as st
-from utils.database import create_habit, get_user_habits, update_habit, delete_habit
+from utils.database import create_habit, update_habit, delete_habit
+from utils.models import Habit, load_habit_page
+from utils.data_transfer import export_user_data, import_stream, CATEGORIES
 from datetime import datetime
+import io
 
 
 def show():
@@ -11,52 +14,10 @@ def show():
     st.title("My Habits")
 
     #Tabs for different actions
-    tab1, tab2 = st.tabs(["View Habits", "Add New Habit"])
+    tab1, tab2, tab3 = st.tabs(["View Habits", "Add New Habit", "Import / Export"])
 
     with tab1:
-        habits = get_user_habits(st.session_state["user_id"])
-
-        if not habits:
-            st.info("No habits yet. Create your first habit in the 'Add New Habit' tab!")
-        else:
-            for habit in habits:
-                with st.expander(f"{habit['name']} ({habit['category']})"):
-                    st.write(f"**Description:** {habit['description']}")
-                    st.write(f"**Started:** {habit['start_date']}")
-
-                    col1, col2 = st.columns(2)
-
-                    with col1:
-                        if st.button("Edit", key=f"edit_{habit['_id']}"):
-                            st.session_state[f"editing_{habit['_id']}"] = True
-                    
-                    with col2:
-                        if st.button("Delete", key=f"del_{habit['_id']}"):
-                            if delete_habit(str(habit['_id']), st.session_state["user_id"]):
-                                st.success("Habit deleted!")
-                                st.rerun()
-
-                    #edit form
-                    if st.session_state.get(f"editing_{habit['_id']}", False):
-                        with st.form(key=f"edit_form_{habit['_id']}"):
-                            new_name = st.text_input("Name", value=habit['name'])
-                            new_category = st.selectbox(
-                                "Category",
-                                ["Health", "Productivity", "Finance", "Learning", "Fitness", "Mindfulness", "Other"],
-                                index=["Health", "Productivity", "Finance", "Learning", "Fitness", "Mindfulness", "Other"].index(habit['category'])
-                            )
-                            new_desc = st.text_area("Description", value=habit['description'])
-
-                            if st.form_submit_button("Update"):
-                                updates = {
-                                    "name": new_name,
-                                    "category": new_category,
-                                    "description": new_desc
-                                }
-                                if update_habit(str(habit['_id']), st.session_state["user_id"], updates):
-                                    st.success("Habit updated!")
-                                    st.session_state[f"editing_{habit['_id']}"] = False
-                                    st.rerun()
+        show_habit_list(st.session_state["user_id"])
     with tab2:
         with st.form("new_habit_form"):
             name = st.text_input("Habit Name *", placeholder="e.g., Morning Exercise")
@@ -78,3 +39,138 @@ def show():
                     )
                     st.success(f"Habit '{name}' created successfully!")
                     st.rerun()
+
+    with tab3:
+        show_import_export()
+
+
+# Habits rendered per page of the View Habits tab
+HABITS_PER_PAGE = 20
+
+
+def show_habit_list(user_id: str):
+    """One page of habits, filtered by name and category"""
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        search = st.text_input("Search", placeholder="Habit name starts with...", key="habit_search")
+    with col2:
+        category = st.selectbox("Category", ["All"] + CATEGORIES, key="habit_category_filter")
+
+    # Cursors of the pages visited so far; new filters start again from page one
+    filters = (search.strip(), category)
+    if st.session_state.get("habit_filters") != filters:
+        st.session_state["habit_filters"] = filters
+        st.session_state["habit_page_cursors"] = [None]
+    cursors = st.session_state["habit_page_cursors"]
+
+    habits, next_cursor = load_habit_page(
+        user_id,
+        limit=HABITS_PER_PAGE,
+        cursor=cursors[-1],
+        category=None if category == "All" else category,
+        name_prefix=search
+    )
+
+    # The last habit on a later page was deleted: step back a page
+    if not habits and len(cursors) > 1:
+        cursors.pop()
+        st.rerun()
+
+    if not habits:
+        if search or category != "All":
+            st.info("No habits match your search.")
+        else:
+            st.info("No habits yet. Create your first habit in the 'Add New Habit' tab!")
+        return
+
+    for habit in habits:
+        show_habit(habit, user_id)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("← Previous", disabled=len(cursors) == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {len(cursors)}")
+    with col3:
+        if st.button("Next →", disabled=next_cursor is None, use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
+
+
+def show_habit(habit: Habit, user_id: str):
+    """Expander with the details, edit form and delete button of one habit"""
+    with st.expander(f"{habit.name} ({habit.category})"):
+        st.write(f"**Description:** {habit.description}")
+        st.write(f"**Started:** {habit.start_date}")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            if st.button("Edit", key=f"edit_{habit.id}"):
+                st.session_state[f"editing_{habit.id}"] = True
+
+        with col2:
+            if st.button("Delete", key=f"del_{habit.id}"):
+                if delete_habit(habit.id, user_id):
+                    st.success("Habit deleted!")
+                    st.rerun()
+
+        #edit form
+        if st.session_state.get(f"editing_{habit.id}", False):
+            with st.form(key=f"edit_form_{habit.id}"):
+                new_name = st.text_input("Name", value=habit.name)
+                new_category = st.selectbox(
+                    "Category",
+                    ["Health", "Productivity", "Finance", "Learning", "Fitness", "Mindfulness", "Other"],
+                    index=["Health", "Productivity", "Finance", "Learning", "Fitness", "Mindfulness", "Other"].index(habit.category)
+                )
+                new_desc = st.text_area("Description", value=habit.description)
+
+                if st.form_submit_button("Update"):
+                    updates = {
+                        "name": new_name,
+                        "category": new_category,
+                        "description": new_desc
+                    }
+                    if update_habit(habit.id, user_id, updates):
+                        st.success("Habit updated!")
+                        st.session_state[f"editing_{habit.id}"] = False
+                        st.rerun()
+
+
+def show_import_export():
+    """Download a backup of all habits and completions, or restore one"""
+    st.subheader("Export")
+    fmt = st.radio("Format", ["ndjson", "csv"], horizontal=True, key="export_format",
+                   format_func=lambda f: f.upper())
+
+    # Only build the file on request, and only for this run: it is never kept
+    # in session_state, so it is freed once the session moves on
+    if st.button("Prepare export"):
+        buffer = io.StringIO()
+        count = export_user_data(st.session_state["user_id"], buffer, fmt)
+        st.download_button(
+            f"Download {count} rows",
+            data=buffer.getvalue(),
+            file_name=f"habits.{fmt}",
+            mime="text/csv" if fmt == "csv" else "application/x-ndjson",
+            # Downloading does not rerun the page, which would drop the button
+            on_click="ignore"
+        )
+
+    st.subheader("Import")
+    uploaded = st.file_uploader("Upload an export file", type=["ndjson", "jsonl", "csv"])
+
+    if uploaded is not None and st.button("Import", type="primary"):
+        import_fmt = "csv" if uploaded.name.endswith(".csv") else "ndjson"
+        stream = io.TextIOWrapper(uploaded, encoding="utf-8", newline="")
+        report = import_stream(st.session_state["user_id"], stream, import_fmt)
+
+        st.success(f"Imported {report['habits']} habits and {report['completions']} completions "
+                   f"({report['duplicates']} duplicates skipped)")
+        if report["errors"]:
+            st.warning(f"{len(report['errors'])} rows were rejected")
+            for line_no, message in report["errors"][:20]:
+                st.caption(f"Line {line_no}: {message}")
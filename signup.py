@@ -1,6 +1,5 @@
 import streamlit as st
-from utils.auth import create_user, verify_password
-from utils.database import get_users_collection
+from utils.auth import create_user
 
 
 def show():
@@ -36,14 +35,11 @@ def show():
         else:
             st.success(f"Account created successfully! Welcome, {name}!")
             
-            # Auto-login the user
-            users_collection = get_users_collection()
-            user = users_collection.find_one({"email": email})
-            
+            # Auto-login the user with what we just stored
             st.session_state["logged_in"] = True
             st.session_state["user_email"] = email
-            st.session_state["user_id"] = str(user["_id"])
-            st.session_state["user_name"] = user["name"]
+            st.session_state["user_id"] = user_id
+            st.session_state["user_name"] = name
             st.session_state["show_signup"] = False
             st.session_state["current_page"] = "Dashboard"
             
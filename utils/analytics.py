@@ -0,0 +1,131 @@
+from utils.database import iter_completed_days
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def load_completion_frame(user_id: str, start: date, end: date):
+    """
+    Fetch a user's completed days between start and end (inclusive) with one
+    projected cursor. Returns a DataFrame with habit_id (str) and day columns.
+    """
+    habit_ids = []
+    days = []
+    for habit_id, day in iter_completed_days(user_id, start_date=start, end_date=end):
+        habit_ids.append(str(habit_id))
+        days.append(day)
+
+    return pd.DataFrame({
+        "habit_id": pd.Series(habit_ids, dtype="object"),
+        "day": np.array(days, dtype="datetime64[D]").astype("datetime64[ns]"),
+    })
+
+
+def build_matrix(frame: pd.DataFrame, habits: list, start: date, end: date):
+    """
+    Build habit x day boolean matrices over [start, end]:
+    done[h, d] is True if habit h was completed on day d, and active[h, d] is
+    True once habit h has started, so rates only count days a habit existed.
+    Returns (done, active, days) where days is a DatetimeIndex.
+    """
+    days = pd.date_range(start, end, freq="D")
+    habit_ids = [h.id for h in habits]
+    done = np.zeros((len(habit_ids), len(days)), dtype=bool)
+
+    if len(frame):
+        row = pd.Index(habit_ids).get_indexer(frame["habit_id"])
+        col = ((frame["day"].values - days[0].to_datetime64()) // np.timedelta64(1, "D")).astype(np.int64)
+        keep = (row >= 0) & (col >= 0) & (col < len(days))
+        done[row[keep], col[keep]] = True
+
+    start_dates = pd.to_datetime(
+        [h.start_date or h.created_at or days[0] for h in habits]
+    ).normalize()
+    start_offsets = ((start_dates.values - days[0].to_datetime64()) // np.timedelta64(1, "D")).astype(np.int64)
+    active = np.arange(len(days))[None, :] >= start_offsets[:, None]
+
+    # A completion recorded before the start date still counts as an active day
+    active |= done
+
+    return done, active, days
+
+
+def _rate(done_counts, active_counts):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(active_counts > 0, done_counts / active_counts, np.nan)
+
+
+def rolling_rates(done: np.ndarray, active: np.ndarray, days: pd.DatetimeIndex, windows=(7, 30)):
+    """Completion rate over trailing windows, one column per window"""
+    daily = pd.DataFrame(
+        {"done": done.sum(axis=0), "active": active.sum(axis=0)},
+        index=days
+    )
+    rates = {}
+    for window in windows:
+        rolled = daily.rolling(window, min_periods=1).sum()
+        rates[f"{window}-day"] = _rate(rolled["done"].values, rolled["active"].values)
+    return pd.DataFrame(rates, index=days)
+
+
+def category_rates(done: np.ndarray, active: np.ndarray, habits: list):
+    """Completion rate per habit category over the whole window"""
+    frame = pd.DataFrame({
+        "category": [h.category for h in habits],
+        "done": done.sum(axis=1),
+        "active": active.sum(axis=1),
+    })
+    grouped = frame.groupby("category")[["done", "active"]].sum()
+    return pd.Series(_rate(grouped["done"].values, grouped["active"].values), index=grouped.index, name="rate")
+
+
+def weekday_rates(done: np.ndarray, active: np.ndarray, days: pd.DatetimeIndex):
+    """Completion rate per weekday, Monday first"""
+    weekday = days.weekday.values
+    done_by_day = np.bincount(weekday, weights=done.sum(axis=0), minlength=7)
+    active_by_day = np.bincount(weekday, weights=active.sum(axis=0), minlength=7)
+    return pd.Series(_rate(done_by_day, active_by_day), index=WEEKDAYS, name="rate")
+
+
+def heatmap(done: np.ndarray, days: pd.DatetimeIndex):
+    """
+    Calendar heatmap data: one row per day with its week column, weekday row
+    and the number of habits completed that day
+    """
+    return pd.DataFrame({
+        "day": days,
+        "week": ((days - days[0]).days.values + days[0].weekday()) // 7,
+        "weekday": np.array(WEEKDAYS)[days.weekday.values],
+        "year": days.year.values,
+        "completed": done.sum(axis=0),
+    })
+
+
+def compute_history(user_id: str, habits: list, days: int = 365, today: date = None):
+    """
+    Everything the dashboard's history section shows, from a single query:
+    heatmap, rolling 7/30-day rates, per-category rates and the best weekday.
+    """
+    today = today or date.today()
+    start = today - timedelta(days=days - 1)
+
+    frame = load_completion_frame(user_id, start, today)
+    return summarize_history(frame, habits, start, today)
+
+
+def summarize_history(frame: pd.DataFrame, habits: list, start: date, end: date):
+    """The compute half of compute_history, split out so it can be timed alone"""
+    done, active, day_index = build_matrix(frame, habits, start, end)
+    weekdays = weekday_rates(done, active, day_index)
+
+    return {
+        "heatmap": heatmap(done, day_index),
+        "rolling": rolling_rates(done, active, day_index),
+        "categories": category_rates(done, active, habits),
+        "weekdays": weekdays,
+        "best_weekday": weekdays.idxmax() if weekdays.notna().any() else None,
+        "overall_rate": _rate(done.sum(), active.sum()).item(),
+    }
@@ -0,0 +1,122 @@
+"""
+Run a page's independent data queries concurrently.
+
+The data functions in utils stay synchronous; this layer awaits them from an
+asyncio event loop on a shared thread pool, so a page can start its habit,
+status, streak and stats queries together and wait for all of them. The
+MongoClient is thread-safe and pooled, so each query gets its own connection.
+
+Two settings keep one page from hogging the pool or hanging:
+
+    PAGE_QUERY_CONCURRENCY   queries of one page in flight at the same time
+    PAGE_QUERY_TIMEOUT       seconds a page waits for its queries, from the
+                             first fetch; queries still running are abandoned
+
+Streamlit scripts are synchronous, so pages use the facade:
+
+    page = PageFetch()
+    values, errors = page.fetch({
+        "status": partial(get_completion_status, user_id, habit_ids, today),
+        "rates": partial(get_category_rates, days=30),
+    })
+
+A query that fails or times out shows up in `errors` instead of `values`;
+the page decides what to render without it.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import os
+import threading
+import time
+
+
+PAGE_CONCURRENCY = int(os.getenv("PAGE_QUERY_CONCURRENCY", "4"))
+PAGE_TIMEOUT = float(os.getenv("PAGE_QUERY_TIMEOUT", "10"))
+
+# Threads running queries for all pages of this process; abandoned queries
+# hold theirs until they return, so keep this above PAGE_QUERY_CONCURRENCY
+QUERY_WORKERS = int(os.getenv("PAGE_QUERY_WORKERS", "16"))
+
+
+_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="page-query")
+
+# One event loop per process, on its own thread, shared by every session
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop():
+    global _loop, _loop_pid
+    with _loop_lock:
+        # A loop inherited through fork() has no thread running it in the child
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="page-query-loop", daemon=True).start()
+        return _loop
+
+
+def run(coroutine):
+    """Run a coroutine on the shared event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_loop()).result()
+
+
+class PageFetch:
+    """The queries of one page render, sharing a concurrency limit and a deadline"""
+
+    def __init__(self, limit: int = None, timeout: float = None):
+        self.limit = limit or PAGE_CONCURRENCY
+        self.timeout = timeout if timeout is not None else PAGE_TIMEOUT
+        # The caller's context, so queries see its bound session cache
+        self.context = contextvars.copy_context()
+        self.deadline = None
+        self._semaphore = None
+
+    def remaining(self) -> float:
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.timeout
+        return max(0.0, self.deadline - time.monotonic())
+
+    async def call(self, function):
+        """Run one zero-argument query within the page's limit and deadline"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        loop = asyncio.get_running_loop()
+
+        async def limited():
+            async with self._semaphore:
+                # Each thread needs its own copy: a context can only be entered once at a time
+                return await loop.run_in_executor(_executor, self.context.copy().run, function)
+
+        return await asyncio.wait_for(limited(), self.remaining())
+
+    async def gather(self, calls: dict):
+        """
+        Run {name: zero-argument callable} concurrently.
+        Returns ({name: value}, {name: exception}).
+        """
+        names = list(calls)
+        results = await asyncio.gather(*(self.call(calls[name]) for name in names), return_exceptions=True)
+
+        values, errors = {}, {}
+        for name, result in zip(names, results):
+            if isinstance(result, asyncio.TimeoutError):
+                print(f"❌ Query {name!r} timed out after {self.timeout:g}s")
+                errors[name] = result
+            elif isinstance(result, Exception):
+                print(f"❌ Query {name!r} failed: {result}")
+                errors[name] = result
+            else:
+                values[name] = result
+        return values, errors
+
+    def fetch(self, calls: dict):
+        """Synchronous gather, for Streamlit scripts"""
+        return run(self.gather(calls))
+
+
+def fetch(calls: dict, limit: int = None, timeout: float = None):
+    """Run {name: zero-argument callable} concurrently as one page fetch"""
+    return PageFetch(limit, timeout).fetch(calls)
@@ -1,20 +1,141 @@
 import bcrypt
+import os
 import re
-from utils.database import get_users_collection
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from pymongo.errors import DuplicateKeyError
+from utils.database import get_users_collection, NOT_DELETED
 from datetime import datetime, timezone
 
 
-def hash_password(password: str) -> str:
+# bcrypt cost factor (log2 rounds) for new hashes; stored hashes with a
+# different cost are rehashed on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Max concurrent bcrypt computations per process, so a burst of logins
+# queues up instead of saturating every core
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Seconds a caller waits for a hash before giving up
+BCRYPT_TIMEOUT = float(os.getenv("BCRYPT_TIMEOUT", "10"))
+
+# bcrypt only looks at the first 72 bytes of a password
+MAX_PASSWORD_BYTES = 72
+
+
+# Returned when a hash could not start within BCRYPT_TIMEOUT
+SERVER_BUSY = "Server busy, please try again"
+
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+# Rehashes after login run on their own single thread so they never hold up logins
+_rehash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bcrypt-rehash")
+
+
+def _run(function, *args):
+    """
+    Run a bcrypt call on the pool and wait up to BCRYPT_TIMEOUT. On timeout the
+    call is cancelled if it is still queued (one already hashing cannot be
+    stopped) and concurrent.futures.TimeoutError is raised.
+    """
+    future = _executor.submit(function, *args)
+    try:
+        return future.result(timeout=BCRYPT_TIMEOUT)
+    except FuturesTimeout:
+        future.cancel()
+        raise
+
+
+def _password_bytes(password: str) -> bytes:
+    """The bytes of a new password; longer ones are rejected rather than cut short"""
     password_bytes = password.encode('utf-8')
-    hashed_bytes = bcrypt.hashpw(password_bytes, bcrypt.gensalt())
+    if len(password_bytes) > MAX_PASSWORD_BYTES:
+        raise ValueError(f"Password must be at most {MAX_PASSWORD_BYTES} bytes")
+    return password_bytes
+
+
+def _stored_password_bytes(password: str) -> bytes:
+    """
+    The bytes to check against a stored hash: older bcrypt releases silently
+    used only the first 72 bytes, so accounts created with longer passwords
+    were hashed from that prefix
+    """
+    return password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+
+
+def _hash(password_bytes: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password_bytes, bcrypt.gensalt(rounds=rounds))
+
+
+def hash_password(password: str, rounds: int = None) -> str:
+    password_bytes = _password_bytes(password)
+    hashed_bytes = _run(_hash, password_bytes, rounds or BCRYPT_ROUNDS)
     hashed_str = hashed_bytes.decode('utf-8')
     return hashed_str
 
 
 def verify_password(password: str, hashed: str) -> bool:
-    password_bytes = password.encode('utf-8')
+    password_bytes = _stored_password_bytes(password)
     hashed_bytes = hashed.encode('utf-8')
-    return bcrypt.checkpw(password_bytes, hashed_bytes)
+    return _run(bcrypt.checkpw, password_bytes, hashed_bytes)
+
+
+def get_hash_rounds(hashed: str) -> int:
+    """Read the cost factor out of a '$2b$12$...' hash"""
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed: str) -> bool:
+    return get_hash_rounds(hashed) != BCRYPT_ROUNDS
+
+
+def _rehash(user_id, password_bytes: bytes, hashed: str) -> bool:
+    new_hash = _hash(password_bytes, BCRYPT_ROUNDS).decode('utf-8')
+    users_collection = get_users_collection()
+    # Only replace the hash we verified, in case it changed in the meantime
+    result = users_collection.update_one(
+        {"_id": user_id, "password": hashed},
+        {"$set": {"password": new_hash}}
+    )
+    return result.modified_count > 0
+
+
+def rehash_if_needed(user_id, password: str, hashed: str):
+    """
+    Call after a successful login: if the stored hash used a different cost,
+    re-hash it with the current one in the background.
+    Returns the Future for the update, or None if no rehash was needed.
+    """
+    if not needs_rehash(hashed):
+        return None
+    return _rehash_executor.submit(_rehash, user_id, _stored_password_bytes(password), hashed)
+
+
+def authenticate_user(email: str, password: str):
+    """
+    Look up a user by email and check the password.
+    Returns (user, None) on success or (None, error message).
+    """
+    users_collection = get_users_collection()
+    # Only what login needs: the hash to check and the name to greet
+    user = users_collection.find_one({"email": email, **NOT_DELETED}, {"name": 1, "password": 1})
+    
+    if not user:
+        return None, "Email not registered."
+    
+    try:
+        if not verify_password(password, user["password"]):
+            return None, "Invalid password."
+    except FuturesTimeout:
+        return None, SERVER_BUSY
+    
+    # Upgrade the stored hash if the bcrypt cost setting has changed
+    rehash_if_needed(user["_id"], password, user["password"])
+    
+    return user, None
 
 
 def create_user(name: str, email: str, password: str):
@@ -25,12 +146,13 @@ def create_user(name: str, email: str, password: str):
     
     users_collection = get_users_collection()
     
-    # Check if email already exists
-    if users_collection.find_one({"email": email}):
-        return None, "Email already registered"
-    
     # Hash the password
-    hashed_password = hash_password(password)
+    if len(password.encode('utf-8')) > MAX_PASSWORD_BYTES:
+        return None, f"Password must be at most {MAX_PASSWORD_BYTES} bytes"
+    try:
+        hashed_password = hash_password(password)
+    except FuturesTimeout:
+        return None, SERVER_BUSY
     
     # Create user document
     user_doc = {
@@ -40,8 +162,11 @@ def create_user(name: str, email: str, password: str):
         "createdAt": datetime.now(timezone.utc)
     }
     
-    # Insert into MongoDB users collection
-    result = users_collection.insert_one(user_doc)
+    # Insert into MongoDB users collection; the unique email index rejects duplicates
+    try:
+        result = users_collection.insert_one(user_doc)
+    except DuplicateKeyError:
+        return None, "Email already registered"
     
     # Return the ObjectId of the new user as a string
     return str(result.inserted_id), None
@@ -0,0 +1,303 @@
+"""
+Bucketed completion storage: one document per habit per month.
+
+    {
+      habit_id: ObjectId, user_id: ObjectId,
+      month: Date (first day of the month, midnight),
+      days: Int64 bitmap, bit d-1 set when day d was completed,
+      notes: {"<day>": "note", ...} (only days that have a note),
+      logged_at: DateTime (time of the latest check-in),
+      updated_at: DateTime (when the server last wrote the document)
+    }
+
+Enabled with COMPLETION_STORAGE=buckets. Run the migration below to copy
+existing per-day completions across before switching.
+"""
+from utils.database import (
+    get_database, get_completions_collection, get_completion_buckets_collection
+)
+from bson import ObjectId, Int64
+from pymongo import UpdateOne, ReturnDocument
+from datetime import datetime, date, timedelta
+import argparse
+import sys
+
+
+def month_start(day) -> datetime:
+    if isinstance(day, datetime):
+        day = day.date()
+    return datetime(day.year, day.month, 1)
+
+
+def _next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _days_in_month(month: datetime) -> int:
+    return (_next_month(month) - month).days
+
+
+def bucket_update(habit_id, user_id, day, completed: bool, note: str = "", logged_at: datetime = None,
+                  expected: bool = None):
+    """
+    The (filter, update) pair that records one day in its month bucket.
+    With `expected`, the filter only matches while the day is still in that
+    state; otherwise the upsert collides with the unique (habit_id, month) index.
+    """
+    if isinstance(day, datetime):
+        day = day.date()
+    bit = Int64(1 << (day.day - 1))
+    key = str(day.day)
+
+    update = {
+        "$bit": {"days": {"or": bit} if completed else {"and": Int64(~bit)}},
+        "$setOnInsert": {"user_id": ObjectId(user_id)},
+        "$set": {"logged_at": logged_at or datetime.now(), "updated_at": datetime.now()},
+    }
+    if note:
+        update["$set"][f"notes.{key}"] = note
+    else:
+        update["$unset"] = {f"notes.{key}": ""}
+
+    query = {"habit_id": ObjectId(habit_id), "month": month_start(day)}
+    if expected is not None:
+        query["days"] = {"$bitsAllSet" if expected else "$bitsAllClear": bit}
+    return query, update
+
+
+def mark_day(habit_id: str, user_id: str, day, completed: bool, note: str = "") -> bool:
+    """
+    Set or clear one day with a single upsert.
+    Returns whether the day was completed before the change.
+    """
+    buckets = get_completion_buckets_collection()
+    query, update = bucket_update(habit_id, user_id, day, completed, note)
+    previous = buckets.find_one_and_update(
+        query, update,
+        projection={"_id": 0, "days": 1},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+    if isinstance(day, datetime):
+        day = day.date()
+    return bool(previous and (previous.get("days", 0) >> (day.day - 1)) & 1)
+
+
+def _range_mask(month: datetime, start: date = None, end: date = None) -> int:
+    """Bits of `month` that fall within [start, end]"""
+    first = 1
+    last = _days_in_month(month)
+    if start is not None and month_start(start) == month:
+        first = start.day
+    if end is not None and month_start(end) == month:
+        last = end.day
+    if last < first:
+        return 0
+    return ((1 << last) - 1) ^ ((1 << (first - 1)) - 1)
+
+
+def _set_days(bits: int):
+    """Day numbers (1-based) of the set bits, lowest first"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length()
+        bits ^= low
+
+
+def _runs(bits: int):
+    """(first day, length) of each run of consecutive set bits"""
+    offset = 0
+    while bits:
+        zeros = (bits & -bits).bit_length() - 1
+        bits >>= zeros
+        offset += zeros
+        length = (~bits & (bits + 1)).bit_length() - 1
+        yield offset + 1, length
+        bits >>= length
+        offset += length
+
+
+def _bucket_query(user_id=None, habit_ids=None, start=None, end=None):
+    query = {}
+    if user_id is not None:
+        query["user_id"] = ObjectId(user_id)
+    if habit_ids is not None:
+        query["habit_id"] = {"$in": [ObjectId(h) for h in habit_ids]}
+    if start is not None or end is not None:
+        query["month"] = {}
+        if start is not None:
+            query["month"]["$gte"] = month_start(start)
+        if end is not None:
+            query["month"]["$lte"] = month_start(end)
+    return query
+
+
+def iter_completed_days(user_id=None, habit_ids=None, start: date = None, end: date = None):
+    """Yield (habit_id, date) for every completed day, decoded from the bitmaps"""
+    buckets = get_completion_buckets_collection()
+    cursor = buckets.find(
+        _bucket_query(user_id, habit_ids, start, end),
+        {"_id": 0, "habit_id": 1, "month": 1, "days": 1}
+    )
+    for bucket in cursor:
+        month = bucket["month"]
+        bits = bucket.get("days", 0) & _range_mask(month, start, end)
+        for day in _set_days(bits):
+            yield bucket["habit_id"], month.date() + timedelta(days=day - 1)
+
+
+def summarize_bitmaps(months, today: date):
+    """
+    Streak stats straight from (month, bitmap) pairs sorted by month, walking
+    runs of set bits rather than individual days
+    """
+    longest = 0
+    run = 0
+    run_end = None
+    for month, bits in months:
+        for first, length in _runs(bits):
+            run_start = month.date() + timedelta(days=first - 1)
+            if run_end is not None and run_start - run_end == timedelta(days=1):
+                run += length
+            else:
+                run = length
+            run_end = run_start + timedelta(days=length - 1)
+            longest = max(longest, run)
+
+    return {
+        "current_streak": run if run_end == today else 0,
+        "longest_streak": longest,
+        "last_completed": run_end,
+    }
+
+
+def get_user_streaks(user_id: str, habit_ids=None, today: date = None):
+    """Bucket-layout counterpart of utils.streaks.get_user_streaks"""
+    today = today or date.today()
+    buckets = get_completion_buckets_collection()
+
+    months_by_habit = {}
+    cursor = buckets.find(
+        _bucket_query(user_id, habit_ids, end=today),
+        {"_id": 0, "habit_id": 1, "month": 1, "days": 1}
+    )
+    for bucket in cursor:
+        months_by_habit.setdefault(str(bucket["habit_id"]), []).append(
+            (bucket["month"], bucket.get("days", 0) & _range_mask(bucket["month"], end=today))
+        )
+
+    streaks = {
+        habit_id: summarize_bitmaps(sorted(months), today)
+        for habit_id, months in months_by_habit.items()
+    }
+    for habit_id in habit_ids or []:
+        streaks.setdefault(str(habit_id), summarize_bitmaps([], today))
+    return streaks
+
+
+def iter_completion_records(user_id: str):
+    """Completed days with their notes, shaped like per-day completion documents"""
+    buckets = get_completion_buckets_collection()
+    cursor = buckets.find({"user_id": ObjectId(user_id)}).sort([("month", 1)])
+    for bucket in cursor:
+        notes = bucket.get("notes", {})
+        for day in _set_days(bucket.get("days", 0)):
+            yield {
+                "habit_id": bucket["habit_id"],
+                "completion_date": bucket["month"] + timedelta(days=day - 1),
+                "completed": True,
+                "note": notes.get(str(day), ""),
+                "logged_at": bucket.get("logged_at", bucket.get("updated_at")),
+            }
+
+
+# ---------- Migration from per-day completion documents ----------
+
+MIGRATION_ID = "completion_buckets"
+
+
+def migrate(batch_size: int = 1000):
+    """
+    Copy per-day completions into month buckets. Progress is tracked by a
+    watermark on the server-side updated_at (logged_at can lie in the past for
+    queued check-ins and imports), so the migration can run while the app is
+    live and be re-run to pick up anything written since; re-applying a day is
+    harmless.
+    Returns the number of completion documents applied.
+    """
+    db = get_database()
+    completions = get_completions_collection()
+    buckets = get_completion_buckets_collection()
+    migrations = db["migrations"]
+
+    state = migrations.find_one({"_id": MIGRATION_ID}) or {}
+    # Runs before this watermark existed tracked logged_at; they start over
+    watermark = state.get("updated_at_watermark")
+    query = {"updated_at": {"$gte": watermark}} if watermark else {}
+
+    applied = 0
+    operations = []
+    cursor = completions.find(query).sort([("updated_at", 1), ("_id", 1)]).batch_size(batch_size)
+    for record in cursor:
+        bucket_filter, update = bucket_update(
+            record["habit_id"], record["user_id"], record["completion_date"],
+            record.get("completed", False), record.get("note", ""), record.get("logged_at")
+        )
+        operations.append(UpdateOne(bucket_filter, update, upsert=True))
+        if record.get("updated_at") is not None:
+            watermark = max(watermark, record["updated_at"]) if watermark else record["updated_at"]
+
+        if len(operations) >= batch_size:
+            buckets.bulk_write(operations, ordered=True)
+            applied += len(operations)
+            operations = []
+            migrations.update_one({"_id": MIGRATION_ID}, {"$set": {"updated_at_watermark": watermark}}, upsert=True)
+
+    if operations:
+        buckets.bulk_write(operations, ordered=True)
+        applied += len(operations)
+    migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"updated_at_watermark": watermark, "finished_at": datetime.now()}},
+        upsert=True
+    )
+    return applied
+
+
+def verify():
+    """Habits whose completed-day count differs between the two layouts"""
+    completions = get_completions_collection()
+    buckets = get_completion_buckets_collection()
+
+    expected = {
+        group["_id"]: group["count"]
+        for group in completions.aggregate([
+            {"$match": {"completed": True}},
+            {"$group": {"_id": "$habit_id", "count": {"$sum": 1}}},
+        ], allowDiskUse=True)
+    }
+    actual = {}
+    for bucket in buckets.find({}, {"_id": 0, "habit_id": 1, "days": 1}):
+        actual[bucket["habit_id"]] = actual.get(bucket["habit_id"], 0) + bin(bucket.get("days", 0)).count("1")
+
+    return {
+        str(habit_id): (expected.get(habit_id, 0), actual.get(habit_id, 0))
+        for habit_id in set(expected) | set(actual)
+        if expected.get(habit_id, 0) != actual.get(habit_id, 0)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m utils.buckets",
+                                     description="Migrate per-day completions into month buckets")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--verify", action="store_true", help="only compare the two layouts")
+    args = parser.parse_args()
+
+    if not args.verify:
+        print(f"Applied {migrate(args.batch_size)} completion document(s)")
+    mismatched = verify()
+    print(f"{len(mismatched)} habit(s) differ between layouts")
+    for habit_id, (expected, actual) in list(mismatched.items())[:50]:
+        print(f"  - {habit_id}: {expected} per-day vs {actual} bucketed")
+    sys.exit(1 if mismatched else 0)
@@ -0,0 +1,145 @@
+"""
+Read-through cache for per-user data: profiles, habit lists and today's status.
+
+Two layers share the same keys: a small LRU per Streamlit session (bound for
+the duration of a rerun with bind_session) in front of a larger LRU for the
+whole process. Entries expire after CACHE_TTL_SECONDS.
+
+Writes call invalidate(user_id, kind), which bumps that user's generation for
+the kind; every entry cached under an older generation, in any session, stops
+matching and ages out of the LRU. Other processes only see a write once their
+entries expire, which is what the TTL bounds, unless the host-wide version
+counters of utils.shared_cache are on (SHARED_CACHE=1): invalidate bumps
+those too, and they are part of every key.
+"""
+from utils import shared_cache
+from collections import OrderedDict
+import contextvars
+import os
+import threading
+import time
+
+
+ENABLED = os.getenv("CACHE_ENABLED", "1") not in ("0", "false", "False")
+TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2000"))
+SESSION_MAX_ENTRIES = int(os.getenv("CACHE_SESSION_MAX_ENTRIES", "50"))
+
+# What can be cached per user
+KINDS = ("profile", "habits", "status")
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Size-bounded LRU with a per-entry time to live. Thread-safe."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_process_cache = LRUCache(MAX_ENTRIES, TTL_SECONDS)
+
+# Bumped on every write; part of each cache key
+_generations = {}
+_generations_lock = threading.Lock()
+
+# The current session's cache, set for each rerun by bind_session
+_session_cache = contextvars.ContextVar("session_cache", default=None)
+
+
+def bind_session(session_state):
+    """Use (and if needed create) the session's own cache for this rerun"""
+    if not ENABLED:
+        return
+    cache = session_state.get("_data_cache")
+    if cache is None:
+        cache = session_state["_data_cache"] = LRUCache(SESSION_MAX_ENTRIES, TTL_SECONDS)
+    _session_cache.set(cache)
+
+
+def _key(kind: str, user_id, extra):
+    user_id = str(user_id)
+    generation = (_generations.get((kind, user_id), 0), shared_cache.get_version(user_id))
+    return (kind, user_id, generation, extra)
+
+
+def cached(kind: str, user_id, extra, loader):
+    """
+    Return the cached value for (kind, user, extra), calling loader() to fill
+    it on a miss. Cached values are shared: callers must not modify them.
+    """
+    if not ENABLED:
+        return loader()
+
+    key = _key(kind, user_id, extra)
+    session = _session_cache.get()
+    if session is not None:
+        value = session.get(key)
+        if value is not _MISSING:
+            return value
+
+    value = _process_cache.get(key)
+    if value is _MISSING:
+        value = loader()
+        _process_cache.set(key, value)
+    if session is not None:
+        session.set(key, value)
+    return value
+
+
+def invalidate(user_id, *kinds):
+    """Drop a user's cached data of the given kinds (all kinds if none given)"""
+    user_id = str(user_id)
+    with _generations_lock:
+        for kind in kinds or KINDS:
+            _generations[(kind, user_id)] = _generations.get((kind, user_id), 0) + 1
+    shared_cache.bump(user_id)
+
+
+def clear():
+    _process_cache.clear()
+    with _generations_lock:
+        _generations.clear()
+
+
+def cache_stats():
+    """Hit and miss counts of the process-wide cache and this session's cache"""
+    stats = {
+        "process": {"entries": len(_process_cache), "hits": _process_cache.hits, "misses": _process_cache.misses},
+    }
+    session = _session_cache.get()
+    if session is not None:
+        stats["session"] = {"entries": len(session), "hits": session.hits, "misses": session.misses}
+    return stats
@@ -0,0 +1,441 @@
+from utils.database import (
+    get_habits_collection, get_completions_collection, get_completion_buckets_collection,
+    get_users_collection, use_buckets, name_key, NOT_DELETED, DUE_NOW
+)
+from utils.streaks import rebuild_all_counters
+from utils import buckets, cache
+from utils.days import day_number, midnight
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime
+import argparse
+import csv
+import json
+import sys
+
+
+# Columns shared by the NDJSON and CSV formats; "type" is "habit" or "completion"
+HABIT_FIELDS = ["habit_id", "name", "category", "description", "start_date", "created_at"]
+COMPLETION_FIELDS = ["habit_id", "completion_date", "completed", "note", "logged_at"]
+CSV_FIELDS = ["type"] + HABIT_FIELDS + [f for f in COMPLETION_FIELDS if f not in HABIT_FIELDS]
+
+CATEGORIES = ["Health", "Productivity", "Finance", "Learning", "Fitness", "Mindfulness", "Other"]
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _to_json_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+# ---------- Export ----------
+
+def iter_export_rows(user_id: str, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Yield a user's habits, then their completions, as flat dicts.
+    Both collections are read through cursors in batches, never as full lists.
+    """
+    habits = get_habits_collection()
+    completions = get_completions_collection()
+    user = ObjectId(user_id)
+
+    habit_cursor = habits.find(
+        {"user_id": user, **NOT_DELETED},
+        {"_id": 1, "name": 1, "category": 1, "description": 1, "start_date": 1, "created_at": 1}
+    ).batch_size(batch_size)
+    # Completions of deleted habits that are still waiting to be purged are skipped
+    exported = set()
+    for habit in habit_cursor:
+        exported.add(habit["_id"])
+        row = {"type": "habit", "habit_id": str(habit["_id"])}
+        row.update({f: _to_json_value(habit.get(f)) for f in HABIT_FIELDS[1:]})
+        yield row
+
+    if use_buckets():
+        completion_cursor = buckets.iter_completion_records(user_id)
+    else:
+        completion_cursor = completions.find(
+            {"user_id": user},
+            {"_id": 0, "habit_id": 1, "completion_date": 1, "completed": 1, "note": 1, "logged_at": 1}
+        ).sort([("completion_date", 1)]).batch_size(batch_size)
+    for record in completion_cursor:
+        if record["habit_id"] not in exported:
+            continue
+        row = {"type": "completion"}
+        row.update({f: _to_json_value(record.get(f)) for f in COMPLETION_FIELDS})
+        yield row
+
+
+def write_ndjson(rows, stream):
+    count = 0
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False))
+        stream.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(rows, stream):
+    writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow({k: ("" if v is None else v) for k, v in row.items()})
+        count += 1
+    return count
+
+
+def export_user_data(user_id: str, stream, fmt: str = "ndjson", batch_size: int = DEFAULT_BATCH_SIZE):
+    """Stream a user's habits and completions to a text stream. Returns the row count."""
+    rows = iter_export_rows(user_id, batch_size)
+    if fmt == "csv":
+        return write_csv(rows, stream)
+    return write_ndjson(rows, stream)
+
+
+# ---------- Import ----------
+
+def read_ndjson(stream):
+    """Yield (line number, row) pairs; unparseable lines come through as strings"""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, f"Invalid JSON: {e}"
+
+
+def read_csv(stream):
+    # Line 1 is the header
+    for line_no, row in enumerate(csv.DictReader(stream), start=2):
+        yield line_no, row
+
+
+def _parse_date(value, field):
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"{field} is not an ISO date: {value!r}")
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("true", "1", "yes"):
+        return True
+    if text in ("false", "0", "no", ""):
+        return False
+    raise ValueError(f"completed is not a boolean: {value!r}")
+
+
+def validate_row(row):
+    """
+    Check and convert one import row. Returns (kind, values) where kind is
+    "habit" or "completion"; raises ValueError with a readable message.
+    """
+    if not isinstance(row, dict):
+        raise ValueError(str(row))
+
+    kind = row.get("type")
+    if kind not in ("habit", "completion"):
+        raise ValueError(f"Unknown row type: {kind!r}")
+
+    try:
+        habit_id = ObjectId(str(row.get("habit_id", "")))
+    except InvalidId:
+        raise ValueError(f"Invalid habit_id: {row.get('habit_id')!r}")
+
+    if kind == "habit":
+        name = (row.get("name") or "").strip()
+        if not name:
+            raise ValueError("Habit name is required")
+        category = row.get("category") or "Other"
+        if category not in CATEGORIES:
+            raise ValueError(f"Unknown category: {category!r}")
+        return kind, {
+            "habit_id": habit_id,
+            "name": name,
+            "category": category,
+            "description": row.get("description") or "",
+            "start_date": _parse_date(row.get("start_date"), "start_date") or datetime.now(),
+            "created_at": _parse_date(row.get("created_at"), "created_at") or datetime.now(),
+        }
+
+    completion_date = _parse_date(row.get("completion_date"), "completion_date")
+    if completion_date is None:
+        raise ValueError("completion_date is required")
+    return kind, {
+        "habit_id": habit_id,
+        # Completions are keyed by midnight of their day
+        "completion_date": midnight(completion_date),
+        "completed": _parse_bool(row.get("completed", True)),
+        "note": row.get("note") or "",
+        "logged_at": _parse_date(row.get("logged_at"), "logged_at") or datetime.now(),
+    }
+
+
+class _Importer:
+    """Buffers validated rows and writes them in unordered bulk chunks"""
+
+    def __init__(self, user_id: str, chunk_size: int):
+        self.user = ObjectId(user_id)
+        self.chunk_size = chunk_size
+        self.habits = get_habits_collection()
+        self.completions = get_completion_buckets_collection() if use_buckets() else get_completions_collection()
+        # Habit ids from the file -> ids in this database
+        self.habit_map = {}
+        self.habit_rows = []
+        self.completion_rows = []
+        self.report = {"habits": 0, "completions": 0, "duplicates": 0, "errors": []}
+
+    def add(self, line_no, kind, values):
+        if kind == "habit":
+            self.habit_rows.append((line_no, values))
+            if len(self.habit_rows) >= self.chunk_size:
+                self.flush_habits()
+        else:
+            # Completions must refer to a habit we already know about
+            if self.habit_rows:
+                self.flush_habits()
+            self.completion_rows.append((line_no, values))
+            if len(self.completion_rows) >= self.chunk_size:
+                self.flush_completions()
+
+    def flush_habits(self):
+        rows, self.habit_rows = self.habit_rows, []
+        if not rows:
+            return
+
+        # Keep the original ids unless another user's habit already has them
+        ids = [values["habit_id"] for _, values in rows]
+        taken = {
+            doc["_id"]
+            for doc in self.habits.find({"_id": {"$in": ids}, "user_id": {"$ne": self.user}}, {"_id": 1})
+        }
+
+        # Copies made by an earlier import of the same file remember their source id
+        copies = {}
+        if taken:
+            for doc in self.habits.find(
+                {"user_id": self.user, "import_source_id": {"$in": list(taken)}},
+                {"_id": 1, "import_source_id": 1}
+            ):
+                copies[doc["import_source_id"]] = doc["_id"]
+
+        operations = []
+        for _, values in rows:
+            source_id = values.pop("habit_id")
+            document = {
+                **values, "name_key": name_key(values["name"]), "user_id": self.user,
+                "next_due": DUE_NOW, "updated_at": datetime.now()
+            }
+            if source_id in taken:
+                target_id = copies.get(source_id) or ObjectId()
+                document["import_source_id"] = source_id
+            else:
+                target_id = source_id
+            self.habit_map[source_id] = target_id
+            operations.append(UpdateOne(
+                {"_id": target_id, "user_id": self.user},
+                {"$setOnInsert": document},
+                upsert=True
+            ))
+
+        upserted, _ = self._bulk_write(self.habits, operations, rows)
+        self.report["habits"] += upserted
+
+    def flush_completions(self):
+        rows, self.completion_rows = self.completion_rows, []
+        if not rows:
+            return
+
+        # Habits referenced by the file but not defined in it must already be ours
+        unknown = {values["habit_id"] for _, values in rows} - set(self.habit_map)
+        if unknown:
+            for doc in self.habits.find({"_id": {"$in": list(unknown)}, "user_id": self.user}, {"_id": 1}):
+                self.habit_map[doc["_id"]] = doc["_id"]
+
+        # Days already completed in their month bucket are duplicates
+        known_days = self._bucket_days(rows) if use_buckets() else {}
+
+        operations = []
+        accepted = []
+        for line_no, values in rows:
+            habit_id = self.habit_map.get(values["habit_id"])
+            if habit_id is None:
+                self.report["errors"].append((line_no, f"Unknown habit_id: {values['habit_id']}"))
+                continue
+            values["habit_id"] = habit_id
+            if use_buckets():
+                # Buckets only record completed days
+                if not values["completed"]:
+                    continue
+                key = (habit_id, buckets.month_start(values["completion_date"]))
+                bit = 1 << (values["completion_date"].day - 1)
+                if known_days.get(key, 0) & bit:
+                    self.report["duplicates"] += 1
+                    continue
+                known_days[key] = known_days.get(key, 0) | bit
+
+                bucket_filter, update = buckets.bucket_update(
+                    habit_id, self.user, values["completion_date"], True,
+                    values["note"], values["logged_at"]
+                )
+                # Keep the bucket's latest check-in time, and any notes it already has;
+                # updated_at stays in $set so rollups see the imported day
+                update["$setOnInsert"]["logged_at"] = update["$set"].pop("logged_at")
+                update.pop("$unset", None)
+                operations.append(UpdateOne(bucket_filter, update, upsert=True))
+            else:
+                # De-duplicate on the unique (habit_id, completion_date) key
+                operations.append(UpdateOne(
+                    {"habit_id": habit_id, "completion_date": values["completion_date"]},
+                    {"$setOnInsert": {
+                        **values, "day": day_number(values["completion_date"]), "user_id": self.user,
+                        "updated_at": datetime.now()
+                    }},
+                    upsert=True
+                ))
+            accepted.append((line_no, values))
+
+        written, failed = self._bulk_write(self.completions, operations, accepted)
+        self.report["completions"] += written
+        self.report["duplicates"] += len(operations) - written - failed
+
+    def _bucket_days(self, rows):
+        """{(habit_id, month): days bitmap} of the existing buckets the rows fall in"""
+        habit_ids = {self.habit_map[values["habit_id"]] for _, values in rows if values["habit_id"] in self.habit_map}
+        months = {buckets.month_start(values["completion_date"]) for _, values in rows}
+        if not habit_ids:
+            return {}
+        cursor = get_completion_buckets_collection().find(
+            {"habit_id": {"$in": list(habit_ids)}, "month": {"$in": sorted(months)}},
+            {"_id": 0, "habit_id": 1, "month": 1, "days": 1}
+        )
+        return {(doc["habit_id"], doc["month"]): int(doc.get("days", 0)) for doc in cursor}
+
+    def _bulk_write(self, collection, operations, rows):
+        """Run an unordered bulk write; returns (documents written, operations failed)"""
+        if not operations:
+            return 0, 0
+        try:
+            result = collection.bulk_write(operations, ordered=False)
+            # Bucket writes modify existing month documents rather than inserting
+            if collection is self.completions and use_buckets():
+                return result.upserted_count + result.modified_count, 0
+            return result.upserted_count, 0
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            for error in errors:
+                line_no = rows[error["index"]][0]
+                self.report["errors"].append((line_no, error.get("errmsg", "Write failed")))
+            return e.details.get("nUpserted", 0), len(errors)
+
+    def finish(self):
+        self.flush_habits()
+        self.flush_completions()
+
+
+def import_user_data(user_id: str, rows, chunk_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Validate and write (line number, row) pairs for a user in unordered bulk
+    chunks. Existing habits and completions are left untouched, so the same
+    file can be imported twice safely. Returns a report dict with counts of
+    habits and completions created, duplicates skipped and per-line errors.
+    """
+    importer = _Importer(user_id, chunk_size)
+
+    for line_no, row in rows:
+        try:
+            kind, values = validate_row(row)
+        except ValueError as e:
+            importer.report["errors"].append((line_no, str(e)))
+            continue
+        importer.add(line_no, kind, values)
+
+    importer.finish()
+
+    # Bring the stored streak counters in line with the imported history
+    if importer.report["habits"] or importer.report["completions"]:
+        rebuild_all_counters(user_id)
+        cache.invalidate(user_id, "habits", "status")
+
+    return importer.report
+
+
+def import_stream(user_id: str, stream, fmt: str = "ndjson", chunk_size: int = DEFAULT_BATCH_SIZE):
+    rows = read_csv(stream) if fmt == "csv" else read_ndjson(stream)
+    return import_user_data(user_id, rows, chunk_size)
+
+
+# ---------- CLI ----------
+
+def _resolve_user(user: str):
+    """Accept a user id or an email address"""
+    if "@" in user:
+        doc = get_users_collection().find_one({"email": user}, {"_id": 1})
+        if not doc:
+            raise SystemExit(f"No user with email {user}")
+        return str(doc["_id"])
+    return user
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.data_transfer",
+                                     description="Export or import a user's habits and completions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export")
+    export_parser.add_argument("user", help="user id or email")
+    export_parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+
+    import_parser = sub.add_parser("import")
+    import_parser.add_argument("user", help="user id or email")
+    import_parser.add_argument("input", help="file to read ('-' for stdin)")
+    import_parser.add_argument("--chunk-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    for p in (export_parser, import_parser):
+        p.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+
+    args = parser.parse_args(argv)
+    user_id = _resolve_user(args.user)
+
+    if args.command == "export":
+        out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+        try:
+            count = export_user_data(user_id, out, args.format)
+        finally:
+            if args.output:
+                out.close()
+        print(f"Exported {count} rows", file=sys.stderr)
+        return 0
+
+    stream = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    try:
+        report = import_stream(user_id, stream, args.format, args.chunk_size)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    print(f"Imported {report['habits']} habits and {report['completions']} completions, "
+          f"skipped {report['duplicates']} duplicates", file=sys.stderr)
+    for line_no, message in report["errors"]:
+        print(f"  line {line_no}: {message}", file=sys.stderr)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
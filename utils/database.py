@@ -1,38 +1,164 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, monitoring
 from dotenv import load_dotenv
 from bson import ObjectId
+from utils import instrumentation
+from utils import cache
+from utils.days import from_day_number, midnight, day_range, day_numbers_ready, local_today
 from datetime import datetime, date
+import atexit
+import base64
+import json
 import os
+import threading
 
 
-# Load environment variables from .env file
+# Load environment variables from .env file. This only fills os.environ (other
+# modules read their settings from it); nothing is validated or connected yet.
 load_dotenv()
 
 
-# Get MongoDB connection string from environment variables
-MONGODB_URI = os.getenv("MONGODB_URI")
-DB_NAME = os.getenv("DB_NAME")
+# Settings are read on first use rather than at import, so importing this
+# module (e.g. to render the login page) costs nothing and never raises.
+# Anything assigned here before first use takes precedence over the environment.
+MONGODB_URI = None
+DB_NAME = None
 
+# How completions are stored: "documents" (one per habit per day) or
+# "buckets" (one per habit per month with a day bitmap, see utils/buckets.py)
+COMPLETION_STORAGE = None
 
-# Check if environment variables are loaded
-if not MONGODB_URI:
-    raise ValueError("MONGODB_URI not found in environment variables. Check your .env file!")
-if not DB_NAME:
-    raise ValueError("DB_NAME not found in environment variables. Check your .env file!")
+# Connection pool settings, overridable from the .env file
+MAX_POOL_SIZE = None
+MIN_POOL_SIZE = None
+SERVER_SELECTION_TIMEOUT_MS = None
+CONNECT_TIMEOUT_MS = None
+SOCKET_TIMEOUT_MS = None
+
+_config_loaded = False
+
+
+def load_config():
+    """Read and check the database settings from the environment (once)"""
+    global _config_loaded, MONGODB_URI, DB_NAME, COMPLETION_STORAGE
+    global MAX_POOL_SIZE, MIN_POOL_SIZE, SERVER_SELECTION_TIMEOUT_MS, CONNECT_TIMEOUT_MS, SOCKET_TIMEOUT_MS
+
+    if _config_loaded:
+        return
+
+    # Get MongoDB connection string from environment variables
+    MONGODB_URI = MONGODB_URI or os.getenv("MONGODB_URI")
+    DB_NAME = DB_NAME or os.getenv("DB_NAME")
+
+    # Check if environment variables are loaded
+    if not MONGODB_URI:
+        raise ValueError("MONGODB_URI not found in environment variables. Check your .env file!")
+    if not DB_NAME:
+        raise ValueError("DB_NAME not found in environment variables. Check your .env file!")
+
+    COMPLETION_STORAGE = COMPLETION_STORAGE or os.getenv("COMPLETION_STORAGE", "documents")
+    if COMPLETION_STORAGE not in ("documents", "buckets"):
+        raise ValueError("COMPLETION_STORAGE must be 'documents' or 'buckets'")
+
+    MAX_POOL_SIZE = MAX_POOL_SIZE or int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+    MIN_POOL_SIZE = MIN_POOL_SIZE or int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+    SERVER_SELECTION_TIMEOUT_MS = SERVER_SELECTION_TIMEOUT_MS or int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    CONNECT_TIMEOUT_MS = CONNECT_TIMEOUT_MS or int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+    SOCKET_TIMEOUT_MS = SOCKET_TIMEOUT_MS or int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "20000"))
+
+    _config_loaded = True
+
+
+class QueryListener(monitoring.CommandListener):
+    """Hands every MongoDB command to utils.instrumentation, see page_timer"""
+
+    def started(self, event):
+        instrumentation.command_started(event)
+
+    def succeeded(self, event):
+        instrumentation.command_finished(event)
+
+    def failed(self, event):
+        instrumentation.command_finished(event, failed=True)
+
+
+# One client (and connection pool) shared by every Streamlit script thread
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide MongoClient, creating it on first use.
+    The ping health check only runs when the client is created.
+    """
+    global _client, _client_pid
+
+    client = _client
+    if client is not None and _client_pid == os.getpid():
+        return client
+
+    with _client_lock:
+        # A client inherited through fork() must not be reused in the child
+        if _client is not None and _client_pid != os.getpid():
+            _client = None
+            _client_pid = None
+
+        if _client is None:
+            load_config()
+            client = MongoClient(
+                MONGODB_URI,
+                maxPoolSize=MAX_POOL_SIZE,
+                minPoolSize=MIN_POOL_SIZE,
+                serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=SOCKET_TIMEOUT_MS,
+                event_listeners=[QueryListener()] if instrumentation.ENABLED else [],
+            )
+            try:
+                # Test the connection once
+                client.admin.command('ping')
+            except Exception:
+                client.close()
+                raise
+            _client = client
+            _client_pid = os.getpid()
+
+        return _client
+
+
+def close_client():
+    """Close the shared client and release its connection pool"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def reset_client():
+    """
+    Forget the shared client without closing it.
+    Runs in forked children, where the parent's sockets must be left alone.
+    """
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+
+
+atexit.register(close_client)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_client)
 
 
 def get_database():
     """
-    Connect to MongoDB and return the database object
+    Return the database object from the shared MongoDB client
     """
     try:
-        client = MongoClient(MONGODB_URI)
-        db = client[DB_NAME]
-        
-        # Test the connection
-        client.admin.command('ping')
-        
-        return db
+        return get_client()[DB_NAME]
     except Exception as e:
         print(f"❌ Error connecting to MongoDB: {e}")
         return None
@@ -62,6 +188,81 @@ def get_completions_collection():
     return db['completions']
 
 
+def get_completion_buckets_collection():
+    """
+    Returns the month-bucketed completions collection
+    """
+    db = get_database()
+    return db['completion_buckets']
+
+
+def use_buckets():
+    load_config()
+    return COMPLETION_STORAGE == "buckets"
+
+
+def get_deletion_jobs_collection():
+    """
+    Returns the queue of pending purges (see utils/deletion.py)
+    """
+    db = get_database()
+    return db['deletion_jobs']
+
+
+# Soft-deleted documents carry a deleted_at timestamp until the purge worker removes them
+NOT_DELETED = {"deleted_at": {"$exists": False}}
+
+# next_due of a habit the reminder scheduler has not looked at yet (see utils/reminders.py)
+DUE_NOW = datetime(1970, 1, 1)
+
+
+def enqueue_purge(kind: str, target_id, user_id):
+    """
+    Queue a background purge of a deleted habit or user. Idempotent: a target
+    only ever has one job.
+    """
+    jobs = get_deletion_jobs_collection()
+    jobs.update_one(
+        {"kind": kind, "target_id": ObjectId(target_id)},
+        {"$setOnInsert": {
+            "user_id": ObjectId(user_id),
+            "state": "pending",
+            "purged": 0,
+            "created_at": datetime.now(),
+            "lease_until": None
+        }},
+        upsert=True
+    )
+
+
+#function to get a user's profile (never the password hash)
+def get_user_profile(user_id: str):
+    def load():
+        users_collection = get_users_collection()
+        return users_collection.find_one(
+            {"_id": ObjectId(user_id), **NOT_DELETED},
+            {"name": 1, "email": 1, "createdAt": 1, "timezone": 1}
+        )
+    return cache.cached("profile", user_id, None, load)
+
+
+#function to get today's date in the user's timezone
+def get_user_today(user_id: str) -> date:
+    profile = get_user_profile(user_id) or {}
+    return local_today(profile.get("timezone"))
+
+
+#function to set the timezone a user's days are counted in
+def set_user_timezone(user_id: str, timezone: str):
+    users_collection = get_users_collection()
+    result = users_collection.update_one(
+        {"_id": ObjectId(user_id), **NOT_DELETED},
+        {"$set": {"timezone": timezone}}
+    )
+    cache.invalidate(user_id, "profile")
+    return result.modified_count > 0
+
+
 #function to create new habit
 def create_habit(user_id: str, name: str, category: str, description: str = "", start_date=None):
     """Create a new habit for the user"""
@@ -71,7 +272,7 @@ def create_habit(user_id: str, name: str, category: str, description: str = "",
     if start_date:
         # If start_date is a datetime.date object, convert to datetime
         if isinstance(start_date, date) and not isinstance(start_date, datetime):
-            start_date = datetime.combine(start_date, datetime.min.time())
+            start_date = midnight(start_date)
     else:
         # Use current datetime
         start_date = datetime.now()
@@ -79,43 +280,268 @@ def create_habit(user_id: str, name: str, category: str, description: str = "",
     habit_doc = {
         "user_id": ObjectId(user_id),
         "name": name,
+        "name_key": name_key(name),
         "category": category,
         "description": description,
         "start_date": start_date,  # ✅ Now it's datetime, not date
-        "created_at": datetime.now()
+        "created_at": datetime.now(),
+        "updated_at": datetime.now(),
+        # Streak counters, maintained by mark_completion (see utils/streaks.py)
+        "current_streak": 0,
+        "longest_streak": 0,
+        "last_completed_date": None,
+        "total_completions": 0,
+        "next_due": DUE_NOW
     }
     
     result = habits_collection.insert_one(habit_doc)
+    cache.invalidate(user_id, "habits")
     return str(result.inserted_id)
 
 
 #function to get user habits
 def get_user_habits(user_id: str):
     habits_collection = get_habits_collection()
-    habits = habits_collection.find({"user_id": ObjectId(user_id)})
+    habits = habits_collection.find({"user_id": ObjectId(user_id), **NOT_DELETED})
     return list(habits)
 
 
+# Fields the My Habits list shows; counters and bookkeeping stay on the server
+HABIT_LIST_FIELDS = {"name": 1, "category": 1, "description": 1, "start_date": 1}
+
+
+def name_key(name: str) -> str:
+    """Case-insensitive sort and search key stored alongside the habit name"""
+    return (name or "").strip().casefold()
+
+
+def _encode_cursor(habit) -> str:
+    raw = json.dumps([habit["name_key"], str(habit["_id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    key, habit_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return key, ObjectId(habit_id)
+
+
+#function to get one page of user habits
+def list_habits_page(user_id: str, limit: int = 20, cursor: str = None,
+                     category: str = None, name_prefix: str = None, fields: dict = None):
+    """
+    Habits ordered by name, `limit` at a time. Pass the returned cursor back
+    to get the next page; it is None on the last page. Every filter and the
+    sort are served by the (user_id[, category], name_key, _id) indexes.
+    Returns (habits, next_cursor).
+    """
+    habits_collection = get_habits_collection()
+
+    conditions = [{"user_id": ObjectId(user_id), **NOT_DELETED}]
+    if category:
+        conditions.append({"category": category})
+
+    prefix = name_key(name_prefix)
+    if prefix:
+        # Everything that starts with the prefix sorts between it and prefix + U+10FFFF
+        conditions.append({"name_key": {"$gte": prefix, "$lt": prefix + "\U0010ffff"}})
+
+    if cursor:
+        last_key, last_id = _decode_cursor(cursor)
+        conditions.append({"$or": [
+            {"name_key": {"$gt": last_key}},
+            {"name_key": last_key, "_id": {"$gt": last_id}},
+        ]})
+
+    projection = {**(fields or HABIT_LIST_FIELDS), "name_key": 1}
+    query = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def load():
+        # One extra document tells us whether there is another page
+        habits = list(
+            habits_collection.find(query, projection)
+            .sort([("name_key", 1), ("_id", 1)])
+            .limit(limit + 1)
+        )
+        next_cursor = _encode_cursor(habits[limit - 1]) if len(habits) > limit else None
+        return habits[:limit], next_cursor
+
+    page_key = ("page", limit, cursor, category, prefix, tuple(sorted(projection)))
+    return cache.cached("habits", user_id, page_key, load)
+
+
+NAME_KEY_MIGRATION_ID = "habit_name_keys"
+
+
+def backfill_name_keys(batch_size: int = 500):
+    """
+    One-off migration adding name_key to habits created before it existed;
+    run it with `python -m utils.database` or `python -m utils.deploy`, never
+    from a page. Walks the _id index once, writes one bulk_write per batch and
+    records itself in `migrations`, so later runs return straight away.
+    Returns the number of habits updated.
+    """
+    migrations = get_database()["migrations"]
+    if migrations.find_one({"_id": NAME_KEY_MIGRATION_ID, "finished_at": {"$exists": True}}, {"_id": 1}):
+        return 0
+
+    habits_collection = get_habits_collection()
+    updated = 0
+    last_id = None
+    while True:
+        query = {"name_key": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(habits_collection.find(query, {"name": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+        habits_collection.bulk_write([
+            UpdateOne({"_id": habit["_id"]}, {"$set": {"name_key": name_key(habit.get("name"))}})
+            for habit in batch
+        ], ordered=False)
+        updated += len(batch)
+        last_id = batch[-1]["_id"]
+
+    migrations.update_one(
+        {"_id": NAME_KEY_MIGRATION_ID},
+        {"$set": {"finished_at": datetime.now()}, "$inc": {"updated": updated}},
+        upsert=True
+    )
+    return updated
+
+
 #function to update habits
 def update_habit(habit_id: str, user_id: str, updates: dict):
     habits_collection = get_habits_collection()
+    if "name" in updates:
+        updates = {**updates, "name_key": name_key(updates["name"])}
     result = habits_collection.update_one(
-        {"_id": ObjectId(habit_id), "user_id": ObjectId(user_id)},
-        {"$set": updates}
+        {"_id": ObjectId(habit_id), "user_id": ObjectId(user_id), **NOT_DELETED},
+        # updated_at also marks the user's rollups for recomputation
+        {"$set": {**updates, "updated_at": datetime.now()}}
     )
+    cache.invalidate(user_id, "habits")
     return result.modified_count > 0
 
 
 #function to delete habit and all its components
 def delete_habit(habit_id: str, user_id: str):
+    """
+    Hide the habit immediately; its completions and the habit document itself
+    are purged in batches by the background deletion worker
+    """
     habits_collection = get_habits_collection()
-    completions_collection = get_completions_collection()
 
-    #delete completions first
-    completions_collection.delete_many({"habit_id": ObjectId(habit_id)})
+    result = habits_collection.update_one(
+        {"_id": ObjectId(habit_id), "user_id": ObjectId(user_id), **NOT_DELETED},
+        # Dropping next_due takes the habit off the reminder schedule
+        {"$set": {"deleted_at": datetime.now(), "updated_at": datetime.now()}, "$unset": {"next_due": ""}}
+    )
+    if result.modified_count == 0:
+        return False
+    cache.invalidate(user_id, "habits", "status")
+
+    # If we crash before this, the orphan sweeper queues the purge later
+    enqueue_purge("habit", habit_id, user_id)
+    return True
+
+
+#function to delete a user account and everything it owns
+def delete_account(user_id: str):
+    """Soft-delete the user and all their habits, then queue the purge"""
+    users_collection = get_users_collection()
+    habits_collection = get_habits_collection()
+    now = datetime.now()
+
+    result = users_collection.update_one(
+        {"_id": ObjectId(user_id), **NOT_DELETED},
+        {"$set": {"deleted_at": now}}
+    )
+    if result.modified_count == 0:
+        return False
 
-    #delete habit
-    result = habits_collection.delete_one(
-        {"_id": ObjectId(habit_id), "user_id": ObjectId(user_id)}
+    habits_collection.update_many(
+        {"user_id": ObjectId(user_id), **NOT_DELETED},
+        # Dropping next_due takes the habits off the reminder schedule
+        {"$set": {"deleted_at": now, "updated_at": now}, "$unset": {"next_due": ""}}
     )
-    return result.deleted_count > 0
+    cache.invalidate(user_id)
+    enqueue_purge("user", user_id, user_id)
+    return True
+
+
+def _to_datetime(value):
+    """Completion dates are stored as midnight datetimes"""
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return midnight(value)
+    return value
+
+
+#function to read completed days from whichever storage layout is active
+def iter_completed_days(user_id=None, habit_ids=None, start_date=None, end_date=None):
+    """
+    Yield (habit_id, date) for each completed day, filtered by user, habits
+    and an inclusive date range, using a single query
+    """
+    if use_buckets():
+        # Imported here because utils.buckets builds on this module
+        from utils import buckets
+        yield from buckets.iter_completed_days(user_id, habit_ids, start_date, end_date)
+        return
+
+    completions_collection = get_completions_collection()
+
+    query = {"completed": True}
+    if user_id is not None:
+        query["user_id"] = ObjectId(user_id)
+    if habit_ids is not None:
+        query["habit_id"] = {"$in": [ObjectId(h) for h in habit_ids]}
+
+    if day_numbers_ready():
+        # Integer range scan on (user_id, day) or (habit_id, day)
+        if start_date is not None or end_date is not None:
+            query["day"] = day_range(start_date, end_date)
+        for record in completions_collection.find(query, {"_id": 0, "habit_id": 1, "day": 1}):
+            yield record["habit_id"], from_day_number(record["day"])
+        return
+
+    # Completions written before day numbers existed may still lack `day`
+    if start_date is not None or end_date is not None:
+        query["completion_date"] = {}
+        if start_date is not None:
+            query["completion_date"]["$gte"] = _to_datetime(start_date)
+        if end_date is not None:
+            query["completion_date"]["$lte"] = _to_datetime(end_date)
+
+    for record in completions_collection.find(query, {"_id": 0, "habit_id": 1, "completion_date": 1}):
+        day = record["completion_date"]
+        if isinstance(day, datetime):
+            day = day.date()
+        yield record["habit_id"], day
+
+
+#function to get completed dates for many habits at once
+def get_completed_dates(user_id: str, start_date, end_date, habit_ids=None):
+    """
+    Return {habit_id: set of dates} completed between start_date and end_date
+    (inclusive), using a single range query
+    """
+    completed = {}
+    for habit_id, day in iter_completed_days(user_id, habit_ids, start_date, end_date):
+        completed.setdefault(str(habit_id), set()).add(day)
+    return completed
+
+
+#function to get completion status of many habits for one day
+def get_completion_status(user_id: str, habit_ids, check_date):
+    """Return {habit_id: completed} for every habit on check_date in one query"""
+    habit_ids = [str(h) for h in habit_ids]
+
+    def load():
+        completed = get_completed_dates(user_id, check_date, check_date, habit_ids)
+        return {h: h in completed for h in habit_ids}
+
+    return cache.cached("status", user_id, (_to_datetime(check_date), tuple(habit_ids)), load)
+
+
+if __name__ == "__main__":
+    print(f"Added name_key to {backfill_name_keys()} habit(s)")
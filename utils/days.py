@@ -0,0 +1,206 @@
+"""
+Canonical day handling.
+
+A completion belongs to a calendar day in its user's timezone. That day is
+stored as an integer day number (days since 1970-01-01) in the `day` field,
+next to the naive midnight `completion_date` kept for older readers and
+exports. Range queries on (user_id, day) and (habit_id, day) are plain
+integer scans.
+
+Users may set an IANA timezone (users.timezone). Without one, the server's
+local date is used, which is how completion dates were always computed.
+
+    python -m utils.days   -> backfill `day` on existing completions
+"""
+from datetime import datetime, date, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import os
+import socket
+import sys
+import threading
+import time
+
+
+EPOCH = date(1970, 1, 1)
+
+# Used for users without a timezone of their own; empty means server local time
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "")
+
+MIGRATION_ID = "completion_day_numbers"
+
+# The process running the migration holds a lease on its `migrations`
+# document, renewed every batch; another process may take over once it expires
+LEASE_SECONDS = int(os.getenv("MIGRATION_LEASE_SECONDS", "120"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def day_number(value) -> int:
+    """Days since 1970-01-01 of a date (or of the date part of a naive datetime)"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+def from_day_number(number: int) -> date:
+    return EPOCH + timedelta(days=number)
+
+
+def as_date(value):
+    """Completion dates are stored as midnight datetimes; compare them as dates"""
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def midnight(value) -> datetime:
+    """The naive midnight datetime completion_date has always been stored as"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return datetime.combine(value, datetime.min.time())
+
+
+def get_zone(name: str = None):
+    """ZoneInfo for a timezone name, or None for server local time"""
+    name = name or DEFAULT_TIMEZONE
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        print(f"❌ Unknown timezone {name!r}, using server local time")
+        return None
+
+
+def local_today(timezone: str = None) -> date:
+    """Today's date in the given timezone"""
+    zone = get_zone(timezone)
+    return datetime.now(zone).date() if zone else date.today()
+
+
+def day_range(start=None, end=None):
+    """An integer range filter for `day` between two dates (inclusive)"""
+    condition = {}
+    if start is not None:
+        condition["$gte"] = day_number(start)
+    if end is not None:
+        condition["$lte"] = day_number(end)
+    return condition
+
+
+# ---------- Migration: add `day` to completions written before it existed ----------
+
+def migrate(batch_size: int = 1000):
+    """
+    Set `day` from completion_date on every completion that lacks it. Safe to
+    re-run and to run while the app is live: new writes already carry `day`.
+    Returns the number of documents updated.
+    """
+    # Imported here because utils.database builds on this module
+    from utils.database import get_database, get_completions_collection
+    from pymongo import UpdateOne
+
+    completions = get_completions_collection()
+    migrations = get_database()["migrations"]
+    updated = 0
+    last_id = None
+
+    # Walk the _id index once instead of rescanning for missing fields
+    while True:
+        query = {"day": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(
+            completions.find(query, {"completion_date": 1}).sort("_id", 1).limit(batch_size)
+        )
+        if not batch:
+            break
+        completions.bulk_write([
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"day": day_number(doc["completion_date"])}})
+            for doc in batch
+        ], ordered=False)
+        updated += len(batch)
+        last_id = batch[-1]["_id"]
+        # Only matches while this process holds the lease
+        migrations.update_one(
+            {"_id": MIGRATION_ID, "worker": WORKER_ID},
+            {"$set": {"lease_until": datetime.now() + timedelta(seconds=LEASE_SECONDS)}}
+        )
+
+    migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {
+            "$set": {"finished_at": datetime.now()},
+            "$inc": {"updated": updated},
+            "$unset": {"worker": "", "lease_until": ""}
+        },
+        upsert=True
+    )
+    return updated
+
+
+# Until the migration has finished, reads fall back to completion_date;
+# the answer is re-checked at most once a minute
+RECHECK_SECONDS = 60
+_migrated = False
+_checked_at = None
+
+
+def day_numbers_ready() -> bool:
+    """Whether every completion carries `day`, so reads can use it"""
+    global _migrated, _checked_at
+    if _migrated:
+        return True
+    now = time.monotonic()
+    if _checked_at is None or now - _checked_at > RECHECK_SECONDS:
+        from utils.database import get_database
+        _migrated = get_database()["migrations"].find_one(
+            {"_id": MIGRATION_ID, "finished_at": {"$exists": True}}, {"_id": 1}
+        ) is not None
+        _checked_at = now
+    return _migrated
+
+
+def claim_migration() -> bool:
+    """
+    Take the migration's lease. False if it has finished or another process
+    holds an unexpired lease.
+    """
+    from utils.database import get_database
+    from pymongo import ReturnDocument
+    from pymongo.errors import DuplicateKeyError
+
+    now = datetime.now()
+    try:
+        claimed = get_database()["migrations"].find_one_and_update(
+            {
+                "_id": MIGRATION_ID,
+                "finished_at": {"$exists": False},
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]
+            },
+            {"$set": {"worker": WORKER_ID, "lease_until": now + timedelta(seconds=LEASE_SECONDS)}},
+            projection={"_id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The document exists but is finished or leased by someone else
+        return False
+    return claimed is not None
+
+
+def start_migration():
+    """
+    Run the migration in a background thread if it has not finished yet and
+    no other process is already running it
+    """
+    if day_numbers_ready() or not claim_migration():
+        return None
+    thread = threading.Thread(target=migrate, name="day-number-migration", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    print(f"Added day numbers to {migrate()} completion(s)")
+    sys.exit(0)
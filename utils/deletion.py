@@ -0,0 +1,180 @@
+from utils.database import (
+    get_database, get_users_collection, get_habits_collection, get_completions_collection,
+    get_completion_buckets_collection, get_deletion_jobs_collection, enqueue_purge
+)
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta
+import os
+import socket
+import sys
+import threading
+import time
+
+
+# Documents deleted per batch, and the pause between batches to spare the primary
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+PURGE_PAUSE_SECONDS = float(os.getenv("PURGE_PAUSE_SECONDS", "0.05"))
+
+# A claimed job is re-claimable once its lease runs out, e.g. after a crash
+LEASE_SECONDS = int(os.getenv("PURGE_LEASE_SECONDS", "60"))
+
+# How often the background worker looks for new jobs
+POLL_SECONDS = float(os.getenv("PURGE_POLL_SECONDS", "10"))
+
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_job():
+    """Take the oldest job that is pending or whose lease has expired"""
+    jobs = get_deletion_jobs_collection()
+    now = datetime.now()
+    return jobs.find_one_and_update(
+        {"$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+        {"$set": {
+            "state": "running",
+            "worker": WORKER_ID,
+            "lease_until": now + timedelta(seconds=LEASE_SECONDS)
+        }},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _purge_in_batches(collection, query, job):
+    """Delete matching documents a batch at a time, renewing the job's lease as we go"""
+    jobs = get_deletion_jobs_collection()
+    total = 0
+
+    while True:
+        ids = [doc["_id"] for doc in collection.find(query, {"_id": 1}).limit(PURGE_BATCH_SIZE)]
+        if not ids:
+            return total
+
+        deleted = collection.delete_many({"_id": {"$in": ids}}).deleted_count
+        total += deleted
+        jobs.update_one(
+            {"_id": job["_id"]},
+            {
+                "$inc": {"purged": deleted},
+                "$set": {"lease_until": datetime.now() + timedelta(seconds=LEASE_SECONDS)}
+            }
+        )
+        if PURGE_PAUSE_SECONDS:
+            time.sleep(PURGE_PAUSE_SECONDS)
+
+
+def run_job(job):
+    """
+    Purge everything a job covers. Every step is idempotent, so a job that was
+    interrupted part-way simply starts over from what is left.
+    """
+    target = job["target_id"]
+
+    if job["kind"] == "habit":
+        _purge_in_batches(get_completions_collection(), {"habit_id": target}, job)
+        _purge_in_batches(get_completion_buckets_collection(), {"habit_id": target}, job)
+        _purge_in_batches(get_database()["notifications"], {"habit_id": target}, job)
+        get_habits_collection().delete_one({"_id": target, "deleted_at": {"$exists": True}})
+
+    elif job["kind"] == "user":
+        _purge_in_batches(get_completions_collection(), {"user_id": target}, job)
+        _purge_in_batches(get_completion_buckets_collection(), {"user_id": target}, job)
+        _purge_in_batches(get_habits_collection(), {"user_id": target}, job)
+        _purge_in_batches(get_database()["daily_stats"], {"user_id": target}, job)
+        _purge_in_batches(get_database()["notifications"], {"user_id": target}, job)
+        get_users_collection().delete_one({"_id": target, "deleted_at": {"$exists": True}})
+
+    # Finished jobs are removed so the same target can be queued again later
+    get_deletion_jobs_collection().delete_one({"_id": job["_id"], "worker": WORKER_ID})
+
+
+def run_pending(max_jobs: int = None):
+    """Process queued jobs until none are claimable. Returns the number processed."""
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        job = claim_job()
+        if job is None:
+            break
+        try:
+            run_job(job)
+        except Exception as e:
+            # Leave the lease to expire so the job is retried later
+            print(f"❌ Purge of {job['kind']} {job['target_id']} failed: {e}")
+            break
+        done += 1
+    return done
+
+
+def sweep_orphans(batch_size: int = 1000):
+    """
+    Queue purges for data left behind by older code or crashes: soft-deleted
+    habits and users with no job, and completions whose habit no longer exists.
+    Returns the number of purges queued.
+    """
+    habits = get_habits_collection()
+    users = get_users_collection()
+    completions = get_completions_collection()
+    queued = 0
+
+    deleted = {"deleted_at": {"$exists": True}}
+    for habit in habits.find(deleted, {"_id": 1, "user_id": 1}).batch_size(batch_size):
+        enqueue_purge("habit", habit["_id"], habit["user_id"])
+        queued += 1
+    for user in users.find(deleted, {"_id": 1}).batch_size(batch_size):
+        enqueue_purge("user", user["_id"], user["_id"])
+        queued += 1
+
+    # Habit ids referenced by completions, checked against habits a batch at a time
+    pipeline = [{"$group": {"_id": "$habit_id", "user_id": {"$first": "$user_id"}}}]
+    pending = []
+
+    def check(batch):
+        existing = {doc["_id"] for doc in habits.find({"_id": {"$in": [g["_id"] for g in batch]}}, {"_id": 1})}
+        count = 0
+        for group in batch:
+            if group["_id"] not in existing:
+                enqueue_purge("habit", group["_id"], group["user_id"])
+                count += 1
+        return count
+
+    for group in completions.aggregate(pipeline, allowDiskUse=True):
+        pending.append(group)
+        if len(pending) >= batch_size:
+            queued += check(pending)
+            pending = []
+    if pending:
+        queued += check(pending)
+
+    return queued
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _worker_loop():
+    while True:
+        try:
+            run_pending()
+        except Exception as e:
+            print(f"❌ Deletion worker error: {e}")
+        time.sleep(POLL_SECONDS)
+
+
+def start_worker():
+    """Start the background purge thread for this process (once)"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name="deletion-worker", daemon=True)
+            _worker.start()
+    return _worker
+
+
+if __name__ == "__main__":
+    # python -m utils.deletion           -> process queued purges, then exit
+    # python -m utils.deletion --sweep   -> queue purges for orphaned data first
+    if "--sweep" in sys.argv[1:]:
+        print(f"Queued {sweep_orphans()} purge(s)")
+    print(f"Processed {run_pending()} purge job(s)")
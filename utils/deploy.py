@@ -0,0 +1,27 @@
+"""
+One-off setup for a deploy, run before the new version serves traffic so
+that no page render has to do it:
+
+    python -m utils.deploy
+
+Creates missing indexes and runs the data backfills that later code relies
+on. Every step is safe to re-run.
+"""
+from utils.indexes import ensure_indexes
+from utils.database import backfill_name_keys
+from utils.days import migrate as add_day_numbers
+from utils.reminders import schedule_missing
+import sys
+
+
+def main():
+    failed = ensure_indexes()
+    print(f"Indexes: {len(failed)} could not be built" if failed else "Indexes: ✅")
+    print(f"Added name_key to {backfill_name_keys()} habit(s)")
+    print(f"Added day numbers to {add_day_numbers()} completion(s)")
+    print(f"Scheduled reminders for {schedule_missing()} habit(s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
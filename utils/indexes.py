@@ -0,0 +1,190 @@
+from utils.database import get_database
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+import sys
+import threading
+
+
+# Indexes the app relies on, per collection
+INDEXES = {
+    "completions": [
+        # One completion record per habit per day
+        {"keys": [("habit_id", ASCENDING), ("completion_date", ASCENDING)], "unique": True},
+        # Per-user status, streak and history range queries
+        {"keys": [("user_id", ASCENDING), ("completion_date", ASCENDING)], "unique": False},
+        # Integer day-number range scans (see utils/days.py)
+        {"keys": [("user_id", ASCENDING), ("day", ASCENDING)], "unique": False},
+        {"keys": [("habit_id", ASCENDING), ("day", ASCENDING)], "unique": False},
+        # Changes since the rollup and bucket migration watermarks
+        # (see utils/rollups.py and utils/buckets.py)
+        {"keys": [("updated_at", ASCENDING)], "unique": False},
+    ],
+    "completion_buckets": [
+        # One bucket per habit per month
+        {"keys": [("habit_id", ASCENDING), ("month", ASCENDING)], "unique": True},
+        {"keys": [("user_id", ASCENDING), ("month", ASCENDING)], "unique": False},
+        {"keys": [("updated_at", ASCENDING)], "unique": False},
+    ],
+    "habits": [
+        # My Habits pages: all habits or one category, ordered by name
+        {"keys": [("user_id", ASCENDING), ("name_key", ASCENDING), ("_id", ASCENDING)], "unique": False},
+        {"keys": [("user_id", ASCENDING), ("category", ASCENDING), ("name_key", ASCENDING), ("_id", ASCENDING)], "unique": False},
+        # Reminder schedule: due habits in order (see utils/reminders.py)
+        {"keys": [("next_due", ASCENDING)], "unique": False},
+        # Habits created, edited or deleted since the rollup watermark
+        {"keys": [("updated_at", ASCENDING)], "unique": False},
+    ],
+    "users": [
+        {"keys": [("email", ASCENDING)], "unique": True},
+    ],
+    "deletion_jobs": [
+        # One purge job per deleted habit or user
+        {"keys": [("kind", ASCENDING), ("target_id", ASCENDING)], "unique": True},
+    ],
+    "daily_stats": [
+        # One rollup row per user, day and category (see utils/rollups.py)
+        {"keys": [("user_id", ASCENDING), ("day", ASCENDING), ("category", ASCENDING)], "unique": True},
+        {"keys": [("day", ASCENDING), ("category", ASCENDING)], "unique": False},
+    ],
+    "daily_category_stats": [
+        {"keys": [("day", ASCENDING), ("category", ASCENDING)], "unique": True},
+    ],
+    "notifications": [
+        # At most one notification per habit, kind and day
+        {"keys": [("habit_id", ASCENDING), ("kind", ASCENDING), ("day", ASCENDING)], "unique": True},
+        # A user's inbox, newest first
+        {"keys": [("user_id", ASCENDING), ("read_at", ASCENDING), ("created_at", ASCENDING)], "unique": False},
+    ],
+}
+
+
+# Fields that a unique index makes unique, used to look for duplicates
+DUPLICATE_CHECKS = {
+    "completions": ["habit_id", "completion_date"],
+    "completion_buckets": ["habit_id", "month"],
+    "users": ["email"],
+    "deletion_jobs": ["kind", "target_id"],
+    "daily_stats": ["user_id", "day", "category"],
+    "daily_category_stats": ["day", "category"],
+    "notifications": ["habit_id", "kind", "day"],
+}
+
+
+def _index_name(keys):
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def ensure_indexes(db=None):
+    """
+    Create any missing indexes. Returns a list of index names that could not
+    be built (usually a unique index blocked by existing duplicates).
+    """
+    db = db if db is not None else get_database()
+    failed = []
+
+    for collection_name, specs in INDEXES.items():
+        collection = db[collection_name]
+        for spec in specs:
+            name = _index_name(spec["keys"])
+            try:
+                collection.create_index(spec["keys"], unique=spec["unique"], name=name)
+            except OperationFailure as e:
+                print(f"❌ Could not create index {collection_name}.{name}: {e}")
+                failed.append(f"{collection_name}.{name}")
+
+    return failed
+
+
+def find_missing_indexes(db=None):
+    """Return the expected indexes that are absent or not unique when they should be"""
+    db = db if db is not None else get_database()
+    missing = []
+
+    for collection_name, specs in INDEXES.items():
+        existing = {
+            tuple(info["key"]): info.get("unique", False)
+            for info in db[collection_name].index_information().values()
+        }
+        for spec in specs:
+            keys = tuple(spec["keys"])
+            if keys not in existing or (spec["unique"] and not existing[keys]):
+                missing.append(f"{collection_name}.{_index_name(spec['keys'])}")
+
+    return missing
+
+
+def warn_missing_indexes():
+    """Print a warning naming missing indexes. Returns the missing names."""
+    try:
+        missing = find_missing_indexes()
+    except Exception as e:
+        print(f"❌ Could not check indexes: {e}")
+        return []
+    if missing:
+        # The atomic upserts rely on the unique ones to prevent duplicate rows
+        print(f"⚠️ Missing indexes: {', '.join(missing)}. Run python -m utils.deploy to build them.")
+    return missing
+
+
+def start_index_check():
+    """Check for missing indexes on a background thread, without building any"""
+    thread = threading.Thread(target=warn_missing_indexes, name="index-check", daemon=True)
+    thread.start()
+    return thread
+
+
+def find_duplicates(db=None, limit: int = 100):
+    """
+    Return {collection: [group, ...]} for rows that would violate a unique index.
+    Each group holds the duplicated key values, the count and the _ids involved.
+    """
+    db = db if db is not None else get_database()
+    duplicates = {}
+
+    for collection_name, fields in DUPLICATE_CHECKS.items():
+        pipeline = [
+            {"$group": {
+                "_id": {field: f"${field}" for field in fields},
+                "count": {"$sum": 1},
+                "ids": {"$push": "$_id"},
+            }},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$limit": limit},
+        ]
+        groups = list(db[collection_name].aggregate(pipeline, allowDiskUse=True))
+        if groups:
+            duplicates[collection_name] = groups
+
+    return duplicates
+
+
+def report(db=None):
+    """Print missing indexes and duplicate rows. Returns True if everything is healthy."""
+    db = db if db is not None else get_database()
+    missing = find_missing_indexes(db)
+    duplicates = find_duplicates(db)
+
+    if missing:
+        print("Missing indexes:")
+        for name in missing:
+            print(f"  - {name}")
+    else:
+        print("✅ All indexes present")
+
+    if duplicates:
+        for collection_name, groups in duplicates.items():
+            print(f"Duplicates in {collection_name}:")
+            for group in groups:
+                print(f"  - {group['_id']} x{group['count']}")
+    else:
+        print("✅ No duplicates found")
+
+    return not missing and not duplicates
+
+
+if __name__ == "__main__":
+    # python -m utils.indexes          -> create missing indexes, then report
+    # python -m utils.indexes --check  -> report only
+    if "--check" not in sys.argv[1:]:
+        ensure_indexes()
+    sys.exit(0 if report() else 1)
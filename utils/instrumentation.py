@@ -0,0 +1,201 @@
+from collections import deque
+from contextlib import contextmanager
+import contextvars
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+# Emits one JSON line per page rerun, to PERF_LOG_PATH or stderr
+logger = logging.getLogger("habit_tracker.perf")
+
+# Opt-in: with it off, no listener is registered and page_timer does nothing
+ENABLED = os.getenv("PERF_INSTRUMENTATION", "0") in ("1", "true", "True")
+LOG_PATH = os.getenv("PERF_LOG_PATH", "")
+
+# Samples kept per (page, caller) for percentiles, and recent reruns kept for the panel
+MAX_SAMPLES = int(os.getenv("PERF_MAX_SAMPLES", "1000"))
+MAX_RERUNS = int(os.getenv("PERF_MAX_RERUNS", "50"))
+
+def _attach_handler():
+    """Send the rerun lines somewhere; the root logger would drop INFO records"""
+    # Streamlit re-imports modules on change; keep a single handler
+    if logger.handlers:
+        return
+    handler = logging.FileHandler(LOG_PATH, encoding="utf-8") if LOG_PATH else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+if ENABLED:
+    _attach_handler()
+
+
+# Frames from these modules are skipped when looking for the calling function
+_SKIP_MODULES = ("pymongo", "bson", "mongomock", "utils.instrumentation", "contextlib", "threading")
+
+
+# The rerun being timed on this script thread, if any
+_current_rerun = contextvars.ContextVar("perf_current_rerun", default=None)
+
+_lock = threading.Lock()
+_pending = {}
+_samples = {}
+_reruns = deque(maxlen=MAX_RERUNS)
+
+
+def _caller(depth: int):
+    """module.function of the nearest app frame that issued the command"""
+    frame = sys._getframe(depth)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_SKIP_MODULES):
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def _documents_returned(reply):
+    cursor = reply.get("cursor")
+    if cursor is not None:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if "value" in reply:
+        return 0 if reply["value"] is None else 1
+    return reply.get("n", 0)
+
+
+def _sample_bucket(key):
+    bucket = _samples.get(key)
+    if bucket is None:
+        bucket = _samples[key] = {
+            "calls": 0,
+            "round_trips": 0,
+            "documents": 0,
+            "db_ms": deque(maxlen=MAX_SAMPLES),
+            "wall_ms": deque(maxlen=MAX_SAMPLES),
+        }
+    return bucket
+
+
+# Called by the pymongo CommandListener in utils.database, which keeps pymongo
+# out of this module so the login page can import it cheaply
+def command_started(event):
+    """Attribute a MongoDB command to the current page and calling function"""
+    # Skip this function and the listener method that called it
+    with _lock:
+        _pending[event.request_id] = (event.command_name, _caller(3), _current_rerun.get())
+
+
+def command_finished(event, failed: bool = False):
+    documents = 0 if failed else _documents_returned(event.reply)
+    with _lock:
+        command, caller, rerun = _pending.pop(event.request_id, (event.command_name, "unknown", None))
+        db_ms = event.duration_micros / 1000
+        page = rerun["page"] if rerun is not None else "(background)"
+
+        bucket = _sample_bucket((page, caller))
+        bucket["round_trips"] += 1
+        bucket["documents"] += documents
+        bucket["db_ms"].append(db_ms)
+
+        if rerun is not None:
+            rerun["round_trips"] += 1
+            rerun["db_ms"] += db_ms
+            rerun["documents"] += documents
+            call = rerun["callers"].setdefault(caller, {"round_trips": 0, "db_ms": 0.0, "documents": 0})
+            call["round_trips"] += 1
+            call["db_ms"] += db_ms
+            call["documents"] += documents
+            if failed:
+                rerun["failed"] += 1
+
+
+@contextmanager
+def page_timer(page: str):
+    """Time one rerun of a page and attribute its queries to it"""
+    if not ENABLED:
+        yield None
+        return
+
+    rerun = {
+        "page": page,
+        "started_at": time.time(),
+        "wall_ms": 0.0,
+        "round_trips": 0,
+        "db_ms": 0.0,
+        "documents": 0,
+        "failed": 0,
+        "callers": {},
+    }
+    token = _current_rerun.set(rerun)
+    start = time.perf_counter()
+    try:
+        yield rerun
+    finally:
+        # st.rerun() exits by raising, so record the rerun either way
+        rerun["wall_ms"] = (time.perf_counter() - start) * 1000
+        _current_rerun.reset(token)
+        with _lock:
+            bucket = _sample_bucket((page, None))
+            bucket["calls"] += 1
+            bucket["round_trips"] += rerun["round_trips"]
+            bucket["documents"] += rerun["documents"]
+            bucket["db_ms"].append(rerun["db_ms"])
+            bucket["wall_ms"].append(rerun["wall_ms"])
+            _reruns.append(rerun)
+        logger.info(json.dumps({"event": "page_rerun", **rerun}, default=str))
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1], 3)}
+
+
+def get_stats():
+    """
+    Aggregated percentiles per page (caller None) and per (page, caller).
+    Returns a list of dicts, slowest pages first.
+    """
+    with _lock:
+        rows = []
+        for (page, caller), bucket in _samples.items():
+            rows.append({
+                "page": page,
+                "caller": caller,
+                "reruns": bucket["calls"],
+                "round_trips": bucket["round_trips"],
+                "documents": bucket["documents"],
+                "db_ms": _percentiles(bucket["db_ms"]),
+                "wall_ms": _percentiles(bucket["wall_ms"]) if caller is None else None,
+            })
+    rows.sort(key=lambda r: (r["page"], r["caller"] is not None, -(r["db_ms"]["p95"] or 0)))
+    return rows
+
+
+def get_recent_reruns(page: str = None):
+    with _lock:
+        return [r for r in _reruns if page is None or r["page"] == page]
+
+
+def reset_stats():
+    with _lock:
+        _samples.clear()
+        _reruns.clear()
+
+
+def dump_stats(path: str = None):
+    """Write the aggregated stats as JSON. Returns the file path."""
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f"habit_tracker_perf_{os.getpid()}.json")
+    with open(path, "w") as f:
+        json.dump({"pid": os.getpid(), "dumped_at": time.time(), "stats": get_stats()}, f, indent=2, default=str)
+    return path
@@ -0,0 +1,117 @@
+"""
+Typed, slotted views of habit and completion documents.
+
+Each model decodes a (projected) document once and keeps both forms of its
+ids, so pages never convert between str and ObjectId in their loops. Fields
+left out of the projection keep their defaults.
+"""
+from utils.database import get_habits_collection, list_habits_page, iter_completed_days, NOT_DELETED
+from utils import cache
+from utils.streaks import COUNTER_FIELDS
+from utils.days import as_date, midnight, from_day_number
+from bson import ObjectId
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+
+
+@dataclass(slots=True)
+class Habit:
+    oid: ObjectId
+    id: str
+    name: str = ""
+    category: str = "Other"
+    description: str = ""
+    start_date: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    # Stored streak counters; None when they were not loaded or not backfilled yet
+    current_streak: Optional[int] = None
+    longest_streak: Optional[int] = None
+    last_completed_date: Optional[datetime] = None
+    total_completions: Optional[int] = None
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "Habit":
+        oid = doc["_id"]
+        get = doc.get
+        return cls(
+            oid, str(oid),
+            get("name", ""), get("category", "Other"), get("description", ""),
+            get("start_date"), get("created_at"),
+            get("current_streak"), get("longest_streak"),
+            get("last_completed_date"), get("total_completions"),
+        )
+
+    @property
+    def has_counters(self) -> bool:
+        return self.current_streak is not None and self.total_completions is not None
+
+    def streak_on(self, today: date) -> int:
+        """Current streak from the stored counters, 0 if the habit was not done today"""
+        if as_date(self.last_completed_date) != today:
+            return 0
+        return self.current_streak or 0
+
+
+@dataclass(slots=True)
+class Completion:
+    habit_oid: ObjectId
+    habit_id: str
+    day: date
+    completed: bool = True
+    note: str = ""
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "Completion":
+        habit_oid = doc["habit_id"]
+        get = doc.get
+        # Documents written before day numbers existed only have completion_date
+        day = from_day_number(doc["day"]) if "day" in doc else as_date(doc["completion_date"])
+        return cls(habit_oid, str(habit_oid), day, get("completed", True), get("note", ""))
+
+
+# Fields each page reads from a habit
+DASHBOARD_FIELDS = ("name", "category", "start_date", "created_at") + COUNTER_FIELDS
+CHECKIN_FIELDS = ("name", "category")
+LIST_FIELDS = ("name", "category", "description", "start_date")
+
+
+def load_habits(user_id: str, fields=DASHBOARD_FIELDS):
+    """All of a user's habits as Habit models, fetching only `fields` (cached)"""
+    def load():
+        habits_collection = get_habits_collection()
+        cursor = habits_collection.find(
+            {"user_id": ObjectId(user_id), **NOT_DELETED},
+            {field: 1 for field in fields}
+        )
+        return [Habit.from_doc(doc) for doc in cursor]
+    return cache.cached("habits", user_id, ("models", tuple(fields)), load)
+
+
+def load_dashboard_habits(user_id: str):
+    return load_habits(user_id, DASHBOARD_FIELDS)
+
+
+def load_checkin_habits(user_id: str):
+    return load_habits(user_id, CHECKIN_FIELDS)
+
+
+def load_completions(user_id: str, habit_ids, start_date: date, end_date: date):
+    """
+    Completed days of the given habits between two dates (inclusive) as
+    Completion models, in one query on whichever storage layout is active (cached)
+    """
+    habit_ids = tuple(str(h) for h in habit_ids)
+
+    def load():
+        return [
+            Completion(habit_oid, str(habit_oid), day)
+            for habit_oid, day in iter_completed_days(user_id, habit_ids, start_date, end_date)
+        ]
+    return cache.cached("status", user_id, ("models", midnight(start_date), midnight(end_date), habit_ids), load)
+
+
+def load_habit_page(user_id: str, **filters):
+    """One page of the My Habits list, see list_habits_page. Returns (habits, next_cursor)."""
+    docs, next_cursor = list_habits_page(user_id, fields={field: 1 for field in LIST_FIELDS}, **filters)
+    return [Habit.from_doc(doc) for doc in docs], next_cursor
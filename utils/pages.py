@@ -0,0 +1,37 @@
+import importlib
+import threading
+
+
+# Page name -> module that provides its show() function. Modules are only
+# imported the first time their page is routed to, so a cold worker serving
+# the login page does not pay for pandas, altair and the other pages.
+PAGES = {
+    "Dashboard": "dashboard",
+    "Today's Check-In": "checkin",
+    "My Habits": "manage_habits",
+    "Sign Up": "signup",
+}
+
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def load_page(name: str):
+    """Import (once) and return the module behind a page"""
+    module = _loaded.get(name)
+    if module is not None:
+        return module
+
+    with _lock:
+        if name not in _loaded:
+            _loaded[name] = importlib.import_module(PAGES[name])
+        return _loaded[name]
+
+
+def show_page(name: str):
+    load_page(name).show()
+
+
+def loaded_pages():
+    return list(_loaded)
@@ -0,0 +1,441 @@
+"""
+Habit reminders and streak-at-risk notices.
+
+Every habit carries `next_due` (UTC): the next time the scheduler needs to
+look at it, normally the user's reminder time on their next day (REMINDER_TIME,
+or the habit's own `reminder_time`, as HH:MM in the user's timezone). New
+habits start at DUE_NOW so the first tick works out their real time.
+
+Each tick only touches due habits. The scheduler keeps the head of the
+schedule in a heap, loaded with one indexed range query on next_due and
+bounded by REMINDER_HEAP_SIZE, and hands due habits to a worker pool in
+batches of REMINDER_BATCH_SIZE. A batch is claimed by moving next_due past a
+lease, so several scheduler processes can share the work. For each habit not
+done today the worker records one notification in `notifications` (the
+in-app inbox): `streak_at_risk` if yesterday kept a streak going, otherwise
+`reminder`. The notifications also go to any sinks in REMINDER_SINKS, then
+the habit is rescheduled for its next day.
+
+    python -m utils.reminders          -> run the scheduler
+    python -m utils.reminders --once   -> run one tick and exit
+"""
+from utils.database import (
+    get_database, get_habits_collection, get_users_collection, iter_completed_days,
+    NOT_DELETED, DUE_NOW
+)
+from utils.days import as_date, day_number, get_zone
+from bson import ObjectId
+from pymongo import UpdateMany
+from pymongo.errors import BulkWriteError
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+import argparse
+import heapq
+import json
+import os
+import smtplib
+import threading
+import time
+
+
+# Local time of day reminders go out, unless a habit has its own reminder_time
+REMINDER_TIME = os.getenv("REMINDER_TIME", "20:00")
+
+# Habits claimed and processed together, and batches processed at once
+BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
+WORKERS = int(os.getenv("REMINDER_WORKERS", "4"))
+
+# Schedule entries held in memory, and how far ahead they are loaded
+HEAP_SIZE = int(os.getenv("REMINDER_HEAP_SIZE", "20000"))
+LOOKAHEAD_SECONDS = float(os.getenv("REMINDER_LOOKAHEAD_SECONDS", "300"))
+
+# A claimed batch is due again after the lease, e.g. if its worker crashed
+LEASE_SECONDS = int(os.getenv("REMINDER_LEASE_SECONDS", "300"))
+
+# Background runs inside the app process (REMINDER_SCHEDULER=1); ticks at
+# least this often, sooner when the heap says something is due
+SCHEDULER_ENABLED = os.getenv("REMINDER_SCHEDULER", "0") in ("1", "true", "True")
+TICK_SECONDS = float(os.getenv("REMINDER_TICK_SECONDS", "30"))
+
+# Where notifications go besides the in-app inbox, e.g. "log,smtp"
+SINK_NAMES = [name.strip() for name in os.getenv("REMINDER_SINKS", "").split(",") if name.strip()]
+LOG_PATH = os.getenv("REMINDER_LOG_PATH", "reminders.log")
+SMTP_HOST = os.getenv("REMINDER_SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("REMINDER_SMTP_PORT", "1025"))
+SMTP_SENDER = os.getenv("REMINDER_SMTP_SENDER", "reminders@habit-tracker.local")
+
+
+def get_notifications_collection():
+    return get_database()["notifications"]
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_time(value: str):
+    try:
+        return datetime.strptime(value, "%H:%M").time()
+    except (TypeError, ValueError):
+        return datetime.strptime(REMINDER_TIME, "%H:%M").time()
+
+
+def _local_today(now: datetime, zone):
+    aware = now.replace(tzinfo=timezone.utc)
+    return (aware.astimezone(zone) if zone else aware.astimezone()).date()
+
+
+def _reminder_at(day, at, zone) -> datetime:
+    """The UTC moment of a local reminder time on a day; no zone means server local time"""
+    local = datetime.combine(day, at, tzinfo=zone) if zone else datetime.combine(day, at).astimezone()
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# ---------- Sinks: where notifications are delivered besides the inbox ----------
+
+class LogSink:
+    """Appends one JSON line per notification to a file"""
+
+    def __init__(self, path: str = None):
+        self.path = path or LOG_PATH
+        self._lock = threading.Lock()
+
+    def deliver(self, notifications, users):
+        lines = [
+            json.dumps({
+                "user_id": str(n["user_id"]), "habit_id": str(n["habit_id"]), "kind": n["kind"],
+                "message": n["message"], "created_at": n["created_at"].isoformat(),
+            })
+            for n in notifications
+        ]
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+class SMTPSink:
+    """Sends each notification as an email through a local SMTP server, e.g. a debugging stand-in"""
+
+    def __init__(self, host: str = None, port: int = None, sender: str = None):
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+        self.sender = sender or SMTP_SENDER
+
+    def deliver(self, notifications, users):
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            for n in notifications:
+                email = users.get(n["user_id"], {}).get("email")
+                if not email:
+                    continue
+                message = EmailMessage()
+                message["From"] = self.sender
+                message["To"] = email
+                message["Subject"] = "Habit Tracker reminder"
+                message.set_content(n["message"])
+                smtp.send_message(message)
+
+
+# name -> factory; register_sink adds more
+SINKS = {"log": LogSink, "smtp": SMTPSink}
+
+
+def register_sink(name: str, factory):
+    """Make a sink available to REMINDER_SINKS: factory() returns an object with deliver(notifications, users)"""
+    SINKS[name] = factory
+
+
+def load_sinks(names=None):
+    sinks = []
+    for name in SINK_NAMES if names is None else names:
+        if name not in SINKS:
+            print(f"❌ Unknown reminder sink {name!r}")
+            continue
+        sinks.append(SINKS[name]())
+    return sinks
+
+
+# ---------- Processing one batch of due habits ----------
+
+def _message(kind: str, habit: dict) -> str:
+    if kind == "streak_at_risk":
+        streak = habit.get("current_streak", 0)
+        return f"🔥 Your {streak}-day streak on {habit['name']} ends today unless you check in"
+    return f"⏰ Don't forget {habit['name']} today"
+
+
+def record(notifications):
+    """
+    Add notifications to the inbox, at most one per habit, kind and day.
+    Returns the ones that were new.
+    """
+    if not notifications:
+        return []
+    try:
+        get_notifications_collection().insert_many(notifications, ordered=False)
+        return notifications
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        other = [error for error in errors if error.get("code") != 11000]
+        if other:
+            print(f"❌ {len(other)} notification(s) could not be recorded: {other[0].get('errmsg')}")
+        failed = {error["index"] for error in errors}
+        return [n for index, n in enumerate(notifications) if index not in failed]
+
+
+def process_batch(habit_ids, now: datetime = None, sinks=()):
+    """
+    Claim the due habits among habit_ids, notify for those not done today and
+    reschedule them. Returns (habits processed, notifications recorded).
+    """
+    now = now or _utc_now()
+    habits_collection = get_habits_collection()
+
+    # Moving next_due past the lease claims the habits; other workers skip them
+    token = ObjectId()
+    habits_collection.update_many(
+        {"_id": {"$in": list(habit_ids)}, "next_due": {"$lte": now}, **NOT_DELETED},
+        {"$set": {"next_due": now + timedelta(seconds=LEASE_SECONDS), "reminder_claim": token}}
+    )
+    habits = list(habits_collection.find(
+        {"_id": {"$in": list(habit_ids)}, "reminder_claim": token},
+        {"user_id": 1, "name": 1, "start_date": 1, "reminder_time": 1, "current_streak": 1, "last_completed_date": 1}
+    ))
+    if not habits:
+        return 0, 0
+
+    users = {
+        user["_id"]: user
+        for user in get_users_collection().find(
+            {"_id": {"$in": list({h["user_id"] for h in habits})}, **NOT_DELETED},
+            {"name": 1, "email": 1, "timezone": 1}
+        )
+    }
+    zones = {user_id: get_zone(user.get("timezone")) for user_id, user in users.items()}
+
+    # Which habits reached today's reminder time, and each one's next due time
+    reschedule = {}
+    orphaned = []
+    checking = {}
+    for habit in habits:
+        if habit["user_id"] not in users:
+            # The account is being deleted
+            orphaned.append(habit["_id"])
+            continue
+        zone = zones[habit["user_id"]]
+        at = _parse_time(habit.get("reminder_time") or REMINDER_TIME)
+        today = _local_today(now, zone)
+        reminder = _reminder_at(today, at, zone)
+        if now >= reminder:
+            reminder = _reminder_at(today + timedelta(days=1), at, zone)
+            started = as_date(habit.get("start_date"))
+            if started is None or started <= today:
+                checking[habit["_id"]] = today
+        reschedule.setdefault(reminder, []).append(habit["_id"])
+
+    notifications = []
+    if checking:
+        done = set(iter_completed_days(
+            habit_ids=list(checking), start_date=min(checking.values()), end_date=max(checking.values())
+        ))
+        created_at = datetime.now()
+        for habit in habits:
+            today = checking.get(habit["_id"])
+            if today is None or (habit["_id"], today) in done:
+                continue
+            at_risk = habit.get("current_streak") and as_date(habit.get("last_completed_date")) == today - timedelta(days=1)
+            kind = "streak_at_risk" if at_risk else "reminder"
+            notifications.append({
+                "user_id": habit["user_id"],
+                "habit_id": habit["_id"],
+                "kind": kind,
+                "day": day_number(today),
+                "message": _message(kind, habit),
+                "created_at": created_at,
+                "read_at": None,
+            })
+
+    # Record before rescheduling: a crash in between re-runs the batch after
+    # the lease, and the inbox's unique index keeps that from duplicating
+    new = record(notifications)
+    for sink in sinks:
+        try:
+            if new:
+                sink.deliver(new, users)
+        except Exception as e:
+            print(f"❌ Reminder sink {type(sink).__name__} failed: {e}")
+
+    # Habits sharing a timezone and reminder time share their next due time
+    operations = [
+        UpdateMany({"_id": {"$in": ids}, "reminder_claim": token},
+                   {"$set": {"next_due": next_due}, "$unset": {"reminder_claim": ""}})
+        for next_due, ids in reschedule.items()
+    ]
+    if orphaned:
+        operations.append(UpdateMany({"_id": {"$in": orphaned}, "reminder_claim": token},
+                                     {"$unset": {"next_due": "", "reminder_claim": ""}}))
+    habits_collection.bulk_write(operations, ordered=False)
+    return len(habits), len(new)
+
+
+# ---------- The scheduler: a heap over next_due, drained by a worker pool ----------
+
+class Scheduler:
+    """Due habits in next_due order, processed in batches on a worker pool"""
+
+    def __init__(self, workers: int = None, batch_size: int = None, heap_size: int = None, sinks=None):
+        self.workers = workers or WORKERS
+        self.batch_size = batch_size or BATCH_SIZE
+        self.heap_size = heap_size or HEAP_SIZE
+        self.sinks = load_sinks() if sinks is None else sinks
+        self._heap = []
+        self._loaded_at = None
+        # True when the last load hit heap_size, so more entries wait in MongoDB
+        self._truncated = False
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reminders")
+
+    def load(self, now: datetime):
+        """Reload the heap with the earliest entries due within the lookahead"""
+        cursor = get_habits_collection().find(
+            {"next_due": {"$lte": now + timedelta(seconds=LOOKAHEAD_SECONDS)}, **NOT_DELETED},
+            {"next_due": 1}
+        ).sort("next_due", 1).limit(self.heap_size)
+        # Already in order, which is a valid heap
+        self._heap = [(doc["next_due"], doc["_id"]) for doc in cursor]
+        self._truncated = len(self._heap) >= self.heap_size
+        self._loaded_at = now
+
+    def _pop_due(self, now: datetime):
+        batch = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+            batch.append(heapq.heappop(self._heap)[1])
+        return batch
+
+    def tick(self, now: datetime = None):
+        """Process every habit due by now. Returns (habits processed, notifications recorded)."""
+        now = now or _utc_now()
+        processed = notified = 0
+        if self._loaded_at is None or now - self._loaded_at >= timedelta(seconds=LOOKAHEAD_SECONDS) or not self._heap:
+            self.load(now)
+
+        pending = set()
+        claimed_since_load = 0
+        while True:
+            batch = self._pop_due(now)
+            if batch:
+                pending.add(self._pool.submit(process_batch, batch, now, self.sinks))
+                # Keep a bounded number of batches queued
+                if len(pending) < self.workers * 2:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            else:
+                done, pending = wait(pending)[0], set()
+
+            for future in done:
+                try:
+                    habits, notifications = future.result()
+                    processed += habits
+                    claimed_since_load += habits
+                    notified += notifications
+                except Exception as e:
+                    # Its habits stay claimed until the lease runs out, then are retried
+                    print(f"❌ Reminder batch failed: {e}")
+
+            if batch or pending:
+                continue
+            # The heap only held the earliest entries; fetch the next ones, unless
+            # the last round claimed nothing (everything left is failing or taken)
+            if not self._truncated or claimed_since_load == 0:
+                break
+            self.load(now)
+            claimed_since_load = 0
+            if not self._heap or self._heap[0][0] > now:
+                break
+
+        return processed, notified
+
+    def seconds_until_due(self, now: datetime = None) -> float:
+        """Time until the earliest loaded entry is due, at most TICK_SECONDS"""
+        now = now or _utc_now()
+        if not self._heap:
+            return TICK_SECONDS
+        return max(0.0, min(TICK_SECONDS, (self._heap[0][0] - now).total_seconds()))
+
+
+def schedule_missing(batch_size: int = 1000):
+    """Give next_due to habits created before reminders existed. Returns the number updated."""
+    habits_collection = get_habits_collection()
+    updated = 0
+    while True:
+        ids = [doc["_id"] for doc in habits_collection.find(
+            {"next_due": {"$exists": False}, **NOT_DELETED}, {"_id": 1}
+        ).limit(batch_size)]
+        if not ids:
+            return updated
+        updated += habits_collection.update_many(
+            {"_id": {"$in": ids}, "next_due": {"$exists": False}}, {"$set": {"next_due": DUE_NOW}}
+        ).modified_count
+
+
+# ---------- Inbox ----------
+
+def get_notifications(user_id: str, unread_only: bool = True, limit: int = 20):
+    """The user's newest notifications"""
+    query = {"user_id": ObjectId(user_id)}
+    if unread_only:
+        query["read_at"] = None
+    return list(
+        get_notifications_collection()
+        .find(query, {"kind": 1, "message": 1, "created_at": 1, "read_at": 1})
+        .sort("created_at", -1)
+        .limit(limit)
+    )
+
+
+def mark_read(user_id: str, notification_ids=None):
+    """Mark some (or all) of the user's notifications as read"""
+    query = {"user_id": ObjectId(user_id), "read_at": None}
+    if notification_ids is not None:
+        query["_id"] = {"$in": [ObjectId(n) for n in notification_ids]}
+    return get_notifications_collection().update_many(query, {"$set": {"read_at": datetime.now()}}).modified_count
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _scheduler_loop():
+    try:
+        schedule_missing()
+    except Exception as e:
+        print(f"❌ Reminder scheduling error: {e}")
+    scheduler = Scheduler()
+    while True:
+        try:
+            scheduler.tick()
+        except Exception as e:
+            print(f"❌ Reminder scheduler error: {e}")
+        time.sleep(scheduler.seconds_until_due())
+
+
+def start_scheduler():
+    """Start the background reminder thread for this process (once)"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = threading.Thread(target=_scheduler_loop, name="reminder-scheduler", daemon=True)
+            _scheduler.start()
+    return _scheduler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m utils.reminders",
+                                     description="Send habit reminders and streak-at-risk notices")
+    parser.add_argument("--once", action="store_true", help="run a single tick and exit")
+    args = parser.parse_args()
+
+    if args.once:
+        print(f"Scheduled {schedule_missing()} habit(s) without next_due")
+        processed, notified = Scheduler().tick()
+        print(f"Processed {processed} due habit(s), recorded {notified} notification(s)")
+    else:
+        _scheduler_loop()
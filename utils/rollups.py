@@ -0,0 +1,362 @@
+"""
+Daily rollups of completions, for category trends and cross-user reports.
+
+    daily_stats:           {user_id, day, category, completed, habits, updated_at}
+    daily_category_stats:  {day, category, completed, habits, users, updated_at}
+
+`completed` is the number of habits in the category done that day and
+`habits` the number that existed (started and not deleted), so
+completed / habits is the completion rate. A user has a row for every day
+from their first habit's start up to their latest check-in; users who
+stopped using the app drop out of the cross-user totals rather than
+counting as zeros.
+
+Incremental runs pick up completions and habits whose server-side
+updated_at is past a watermark (minus ROLLUP_LAG_SECONDS, for writes still
+in flight when the last run started) and recompute the affected users' days
+from the source data, so re-running over the same range is harmless.
+updated_at is stamped when the write reaches MongoDB, so check-ins that sat
+in the write-behind queue are still picked up.
+
+    python -m utils.rollups                    -> incremental run
+    python -m utils.rollups --backfill [--since 2024-01-01]
+"""
+from utils.database import (
+    get_database, get_habits_collection, get_completions_collection,
+    get_completion_buckets_collection, get_users_collection, iter_completed_days,
+    use_buckets, NOT_DELETED
+)
+from utils.days import as_date, midnight
+from bson import ObjectId
+from pymongo import UpdateOne
+from datetime import datetime, date, timedelta
+import argparse
+import os
+import threading
+import time
+
+
+# How far before the watermark each run looks again
+LAG_SECONDS = int(os.getenv("ROLLUP_LAG_SECONDS", "3600"))
+
+# Background runs inside the app process (ROLLUP_SCHEDULER=1), every interval
+SCHEDULER_ENABLED = os.getenv("ROLLUP_SCHEDULER", "0") in ("1", "true", "True")
+INTERVAL_SECONDS = float(os.getenv("ROLLUP_INTERVAL_SECONDS", "300"))
+
+STATE_ID = "daily_stats"
+
+
+def get_daily_stats_collection():
+    return get_database()["daily_stats"]
+
+
+def get_daily_category_stats_collection():
+    return get_database()["daily_category_stats"]
+
+
+def rollup_user(user_id, start: date, end: date):
+    """
+    Recompute one user's daily_stats rows for every day in [start, end].
+    Returns the days written.
+    """
+    user = ObjectId(user_id)
+    habits = list(get_habits_collection().find(
+        {"user_id": user, **NOT_DELETED},
+        {"category": 1, "start_date": 1, "created_at": 1}
+    ))
+    category_of = {h["_id"]: h.get("category", "Other") for h in habits}
+
+    # Habits joining each category per day; those started earlier count from `start`
+    starts = {}
+    for habit in habits:
+        since = max(as_date(habit.get("start_date") or habit.get("created_at")) or start, start)
+        by_category = starts.setdefault(since, {})
+        by_category[category_of[habit["_id"]]] = by_category.get(category_of[habit["_id"]], 0) + 1
+
+    completed = {}
+    for habit_id, day in iter_completed_days(user, start_date=start, end_date=end):
+        category = category_of.get(habit_id)
+        if category is not None:
+            by_category = completed.setdefault(day, {})
+            by_category[category] = by_category.get(category, 0) + 1
+
+    now = datetime.now()
+    operations = []
+    existing = {}
+    day = start
+    while day <= end:
+        for category, count in starts.get(day, {}).items():
+            existing[category] = existing.get(category, 0) + count
+        done = completed.get(day, {})
+        for category in existing.keys() | done.keys():
+            operations.append(UpdateOne(
+                {"user_id": user, "day": midnight(day), "category": category},
+                {"$set": {
+                    "completed": done.get(category, 0),
+                    "habits": existing.get(category, 0),
+                    "updated_at": now,
+                }},
+                upsert=True
+            ))
+        day += timedelta(days=1)
+
+    stats = get_daily_stats_collection()
+    if operations:
+        stats.bulk_write(operations, ordered=False)
+    # Categories the user no longer has any habits in
+    stats.delete_many({
+        "user_id": user,
+        "day": {"$gte": midnight(start), "$lte": midnight(end)},
+        "category": {"$nin": sorted(set(category_of.values()))},
+    })
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+
+def rollup_days(days):
+    """Recompute the cross-user daily_category_stats rows of the given days from daily_stats"""
+    days = sorted({midnight(d) for d in days})
+    if not days:
+        return 0
+
+    pipeline = [
+        {"$match": {"day": {"$in": days}}},
+        {"$group": {
+            "_id": {"day": "$day", "category": "$category"},
+            "completed": {"$sum": "$completed"},
+            "habits": {"$sum": "$habits"},
+            "users": {"$sum": 1},
+        }},
+    ]
+    now = datetime.now()
+    operations = [
+        UpdateOne(
+            {"day": group["_id"]["day"], "category": group["_id"]["category"]},
+            {"$set": {
+                "completed": group["completed"],
+                "habits": group["habits"],
+                "users": group["users"],
+                "updated_at": now,
+            }},
+            upsert=True
+        )
+        for group in get_daily_stats_collection().aggregate(pipeline, allowDiskUse=True)
+    ]
+    if operations:
+        get_daily_category_stats_collection().bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def _dirty_days(since: datetime):
+    """(user_id, day) pairs whose completions or habits changed at or after `since`"""
+    # A created, edited or deleted habit changes its category's counts from its start on
+    habits = get_habits_collection().find(
+        {"updated_at": {"$gte": since}}, {"_id": 0, "user_id": 1, "start_date": 1, "created_at": 1}
+    )
+    for habit in habits:
+        day = as_date(habit.get("start_date") or habit.get("created_at"))
+        if day is not None:
+            yield habit["user_id"], day
+
+    if use_buckets():
+        # A changed bucket may have touched any day of its month
+        buckets = get_completion_buckets_collection()
+        for bucket in buckets.find({"updated_at": {"$gte": since}}, {"_id": 0, "user_id": 1, "month": 1}):
+            month = bucket["month"].date()
+            day = month
+            while day.month == month.month:
+                yield bucket["user_id"], day
+                day += timedelta(days=1)
+        return
+
+    completions = get_completions_collection()
+    cursor = completions.find(
+        {"updated_at": {"$gte": since}},
+        {"_id": 0, "user_id": 1, "completion_date": 1}
+    )
+    for record in cursor:
+        yield record["user_id"], as_date(record["completion_date"])
+
+
+def _first_habit_day(user_id):
+    first = get_habits_collection().find_one(
+        {"user_id": ObjectId(user_id), **NOT_DELETED},
+        {"start_date": 1, "created_at": 1},
+        sort=[("start_date", 1)]
+    )
+    if first is None:
+        return None
+    return as_date(first.get("start_date") or first.get("created_at"))
+
+
+def _resume_day(user_id, today: date):
+    """
+    The day after the user's latest row, or their first habit's start if they
+    have none, so a user's rows stay contiguous across quiet periods
+    """
+    latest = get_daily_stats_collection().find_one(
+        {"user_id": ObjectId(user_id)}, {"_id": 0, "day": 1}, sort=[("user_id", 1), ("day", -1)]
+    )
+    if latest is not None:
+        return latest["day"].date() + timedelta(days=1)
+    return _first_habit_day(user_id) or today
+
+
+def run(today: date = None):
+    """
+    Roll up everything written since the last run. Returns the number of
+    users recomputed.
+    """
+    today = today or date.today()
+    state_collection = get_database()["rollup_state"]
+    state = state_collection.find_one({"_id": STATE_ID}) or {}
+    started_at = datetime.now()
+
+    watermark = state.get("watermark")
+    since = watermark - timedelta(seconds=LAG_SECONDS) if watermark else datetime.min
+
+    # Each user's earliest changed day; everything from there to today is redone
+    first_day = {}
+    for user_id, day in _dirty_days(since):
+        if day <= today and (user_id not in first_day or day < first_day[user_id]):
+            first_day[user_id] = day
+
+    days = set()
+    for user_id, start in first_day.items():
+        start = min(start, _resume_day(user_id, today))
+        days.update(rollup_user(user_id, start, today))
+    rollup_days(days)
+
+    state_collection.update_one(
+        {"_id": STATE_ID},
+        {"$set": {"watermark": started_at, "finished_at": datetime.now()}},
+        upsert=True
+    )
+    return len(first_day)
+
+
+def backfill(since: date = None, today: date = None, batch_size: int = 500):
+    """
+    Recompute every user's rows from `since` (or their first habit) to today,
+    then move the watermark so incremental runs continue from here.
+    Returns the number of users processed.
+    """
+    today = today or date.today()
+    started_at = datetime.now()
+    processed = 0
+    days = set()
+
+    users = get_users_collection().find(NOT_DELETED, {"_id": 1}).batch_size(batch_size)
+    for user in users:
+        first = _first_habit_day(user["_id"])
+        if first is None:
+            continue
+        start = since or first
+        if start <= today:
+            days.update(rollup_user(user["_id"], start, today))
+        processed += 1
+
+        # Keep the cross-user pass bounded in memory
+        if len(days) >= batch_size:
+            rollup_days(days)
+            days = set()
+
+    rollup_days(days)
+    get_database()["rollup_state"].update_one(
+        {"_id": STATE_ID},
+        {"$set": {"watermark": started_at, "finished_at": datetime.now(), "backfilled_at": datetime.now()}},
+        upsert=True
+    )
+    return processed
+
+
+# ---------- Read APIs: bounded by days x categories, not by completions ----------
+
+def _rates(rows):
+    totals = {}
+    for row in rows:
+        done, existing = totals.get(row["category"], (0, 0))
+        totals[row["category"]] = (done + row["completed"], existing + row["habits"])
+    return {
+        category: done / existing if existing else None
+        for category, (done, existing) in totals.items()
+    }
+
+
+def get_user_category_rates(user_id: str, days: int = 30, today: date = None):
+    """{category: completion rate} for one user over the last `days` days"""
+    today = today or date.today()
+    rows = get_daily_stats_collection().find(
+        {
+            "user_id": ObjectId(user_id),
+            "day": {"$gte": midnight(today - timedelta(days=days - 1)), "$lte": midnight(today)},
+        },
+        {"_id": 0, "category": 1, "completed": 1, "habits": 1}
+    )
+    return _rates(rows)
+
+
+def get_category_rates(days: int = 30, today: date = None):
+    """{category: completion rate} across all users over the last `days` days"""
+    today = today or date.today()
+    rows = get_daily_category_stats_collection().find(
+        {"day": {"$gte": midnight(today - timedelta(days=days - 1)), "$lte": midnight(today)}},
+        {"_id": 0, "category": 1, "completed": 1, "habits": 1}
+    )
+    return _rates(rows)
+
+
+def get_category_trend(start: date, end: date, category: str = None, user_id: str = None):
+    """
+    Daily rows between start and end (inclusive), for one user or all users:
+    [{"day", "category", "completed", "habits", "rate"}, ...] ordered by day
+    """
+    query = {"day": {"$gte": midnight(start), "$lte": midnight(end)}}
+    if category is not None:
+        query["category"] = category
+    if user_id is not None:
+        query["user_id"] = ObjectId(user_id)
+        collection = get_daily_stats_collection()
+    else:
+        collection = get_daily_category_stats_collection()
+
+    rows = []
+    for row in collection.find(query, {"_id": 0, "day": 1, "category": 1, "completed": 1, "habits": 1}).sort("day", 1):
+        row["rate"] = row["completed"] / row["habits"] if row["habits"] else None
+        rows.append(row)
+    return rows
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _scheduler_loop():
+    while True:
+        try:
+            run()
+        except Exception as e:
+            print(f"❌ Rollup error: {e}")
+        time.sleep(INTERVAL_SECONDS)
+
+
+def start_scheduler():
+    """Start the background rollup thread for this process (once)"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = threading.Thread(target=_scheduler_loop, name="rollup-scheduler", daemon=True)
+            _scheduler.start()
+    return _scheduler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m utils.rollups",
+                                     description="Roll completions up into daily_stats")
+    parser.add_argument("--backfill", action="store_true", help="recompute all users instead of new data only")
+    parser.add_argument("--since", type=date.fromisoformat, help="first day to backfill (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    if args.backfill:
+        print(f"Backfilled {backfill(args.since)} user(s)")
+    else:
+        print(f"Rolled up {run()} user(s)")
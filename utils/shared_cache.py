@@ -0,0 +1,195 @@
+"""
+Host-wide cache of computed dashboard aggregates, shared by every Streamlit
+worker process on the machine.
+
+With SHARED_CACHE=1, values are pickled into a local SQLite file (WAL mode)
+under a key that includes the user's version number. Every write path bumps
+the version through cache.invalidate, so once a write has committed no
+process reads an entry computed before it; old entries are deleted with the
+bump. The file is capped at SHARED_CACHE_MAX_BYTES of values, evicting the
+least recently used entries first.
+
+Versions only move on this host: writes made from another machine are
+picked up once entries expire after SHARED_CACHE_TTL_SECONDS.
+
+    python -m utils.shared_cache           -> entry counts and size
+    python -m utils.shared_cache --clear   -> drop every entry
+"""
+import argparse
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+
+ENABLED = os.getenv("SHARED_CACHE", "0") in ("1", "true", "True")
+
+CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "shared_cache.db")
+MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TTL_SECONDS = float(os.getenv("SHARED_CACHE_TTL_SECONDS", "3600"))
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    user_id  TEXT PRIMARY KEY,
+    version  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key          TEXT PRIMARY KEY,
+    user_id      TEXT NOT NULL,
+    version      INTEGER NOT NULL,
+    value        BLOB NOT NULL,
+    size         INTEGER NOT NULL,
+    expires_at   REAL NOT NULL,
+    accessed_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_user ON entries (user_id, version);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (accessed_at);
+"""
+
+
+_local = threading.local()
+
+
+def _connection():
+    """One SQLite connection per thread (and per process after a fork)"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(CACHE_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Losing recent entries in a crash only costs a recompute
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def _version(conn, user_id: str) -> int:
+    row = conn.execute("SELECT version FROM versions WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def get_version(user_id) -> int:
+    """The user's current version, 0 before their first write (or when disabled)"""
+    if not ENABLED:
+        return 0
+    try:
+        return _version(_connection(), str(user_id))
+    except sqlite3.Error as e:
+        print(f"❌ Shared cache error: {e}")
+        return 0
+
+
+def bump(user_id):
+    """Move the user to a new version and drop their entries from older ones"""
+    if not ENABLED:
+        return
+    user_id = str(user_id)
+    conn = _connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            """
+            INSERT INTO versions (user_id, version) VALUES (?, 1)
+            ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+            """,
+            (user_id,)
+        )
+        conn.execute(
+            "DELETE FROM entries WHERE user_id = ? AND version < ?",
+            (user_id, _version(conn, user_id))
+        )
+        conn.execute("COMMIT")
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        print(f"❌ Shared cache error: {e}")
+
+
+def _evict(conn):
+    """Delete least recently used entries until the values fit in MAX_BYTES"""
+    conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    if total <= MAX_BYTES:
+        return
+    for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        total -= size
+        if total <= MAX_BYTES:
+            break
+
+
+def cached(user_id, key, loader):
+    """
+    Return the user's value for `key` (any tuple with a stable repr), calling
+    loader() to compute and store it on a miss. Falls back to loader() if the
+    cache file cannot be used.
+    """
+    if not ENABLED:
+        return loader()
+
+    user_id = str(user_id)
+    try:
+        conn = _connection()
+        # Read the version before computing, so a write that lands meanwhile
+        # leaves the new value stored under a version nobody reads any more
+        version = _version(conn, user_id)
+        full_key = f"{user_id}:{version}:{key!r}"
+        now = time.time()
+        row = conn.execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at >= ?", (full_key, now)
+        ).fetchone()
+        if row is not None:
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, full_key))
+            return pickle.loads(row[0])
+    except sqlite3.Error as e:
+        print(f"❌ Shared cache error: {e}")
+        return loader()
+
+    value = loader()
+
+    try:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) <= MAX_BYTES:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            if _version(conn, user_id) == version:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO entries (key, user_id, version, value, size, expires_at, accessed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (full_key, user_id, version, blob, len(blob), now + TTL_SECONDS, now)
+                )
+                _evict(conn)
+            conn.execute("COMMIT")
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        print(f"❌ Shared cache error: {e}")
+    return value
+
+
+def clear():
+    _connection().execute("DELETE FROM entries")
+
+
+def cache_stats():
+    """Entry count, users with entries and total value size of the cache file"""
+    entries, users, size = _connection().execute(
+        "SELECT COUNT(*), COUNT(DISTINCT user_id), COALESCE(SUM(size), 0) FROM entries"
+    ).fetchone()
+    return {"entries": entries, "users": users, "bytes": size, "max_bytes": MAX_BYTES}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m utils.shared_cache",
+                                     description="Inspect or clear the shared dashboard cache")
+    parser.add_argument("--clear", action="store_true", help="drop every cached entry")
+    args = parser.parse_args()
+
+    if args.clear:
+        clear()
+    print(cache_stats())
@@ -0,0 +1,248 @@
+from utils.database import get_habits_collection, iter_completed_days, use_buckets
+from utils.days import as_date, midnight
+from bson import ObjectId
+from pymongo import UpdateOne
+from datetime import date, timedelta
+import sys
+
+
+def summarize_dates(dates, today: date = None):
+    """
+    Compute streak stats from a collection of completed dates.
+    Current streak counts back from today, so it is 0 if today is not done.
+    """
+    today = today or date.today()
+    ordered = sorted(set(dates))
+
+    longest = 0
+    run = 0
+    previous = None
+    for day in ordered:
+        if previous is not None and day - previous == timedelta(days=1):
+            run += 1
+        else:
+            run = 1
+        longest = max(longest, run)
+        previous = day
+
+    # The last run is the current streak only if it ends today
+    current = run if previous == today else 0
+
+    return {
+        "current_streak": current,
+        "longest_streak": longest,
+        "last_completed": previous,
+    }
+
+
+def load_completion_dates(user_id: str, habit_ids=None):
+    """
+    Fetch completed dates for all of a user's habits in one query.
+    Returns {habit_id: [date, ...]}.
+    """
+    dates_by_habit = {}
+    for habit_id, day in iter_completed_days(user_id, habit_ids):
+        dates_by_habit.setdefault(str(habit_id), []).append(day)
+    return dates_by_habit
+
+
+def get_user_streaks(user_id: str, habit_ids=None, today: date = None):
+    """
+    Current streak, longest streak and last completion for every habit of a user.
+    Costs a single query regardless of how many habits or how long the streaks are.
+    Habits listed in habit_ids with no completions get zeroed stats.
+    """
+    today = today or date.today()
+    if use_buckets():
+        # Streaks straight from the month bitmaps
+        from utils import buckets
+        return buckets.get_user_streaks(user_id, habit_ids, today)
+
+    dates_by_habit = load_completion_dates(user_id, habit_ids)
+
+    streaks = {
+        habit_id: summarize_dates(dates, today)
+        for habit_id, dates in dates_by_habit.items()
+    }
+
+    for habit_id in habit_ids or []:
+        streaks.setdefault(str(habit_id), summarize_dates([], today))
+
+    return streaks
+
+
+# Streak counters stored on each habit document, kept up to date by mark_completion.
+# current_streak is the run ending on last_completed_date; use current_streak() to read
+# it, which rolls over to 0 once a day has passed without a check-in.
+COUNTER_FIELDS = ("current_streak", "longest_streak", "last_completed_date", "total_completions")
+
+
+def empty_counters():
+    return {
+        "current_streak": 0,
+        "longest_streak": 0,
+        "last_completed_date": None,
+        "total_completions": 0,
+    }
+
+
+def counters_from_dates(dates):
+    """Build the stored counter fields from a habit's completed dates"""
+    dates = set(as_date(d) for d in dates)
+    if not dates:
+        return empty_counters()
+
+    last = max(dates)
+    # Anchoring at the last completion gives the run that ends there
+    stats = summarize_dates(dates, today=last)
+    return {
+        "current_streak": stats["current_streak"],
+        "longest_streak": stats["longest_streak"],
+        "last_completed_date": midnight(last),
+        "total_completions": len(dates),
+    }
+
+
+def has_counters(habit: dict):
+    return all(field in habit for field in COUNTER_FIELDS)
+
+
+def current_streak(habit: dict, today: date = None):
+    """Current streak from the stored counters, 0 if the habit was not done today"""
+    today = today or date.today()
+    if as_date(habit.get("last_completed_date")) != today:
+        return 0
+    return habit.get("current_streak", 0)
+
+
+def rebuild_habit_counters(habit_id: str):
+    """Recompute one habit's counters from its completions and store them"""
+    habits = get_habits_collection()
+
+    dates = [day for _, day in iter_completed_days(habit_ids=[habit_id])]
+    counters = counters_from_dates(dates)
+    habits.update_one({"_id": ObjectId(habit_id)}, {"$set": counters})
+    return counters
+
+
+def apply_completion_change(habit_id: str, completion_date: date, completed: bool):
+    """
+    Update a habit's counters after one of its days flipped state.
+    Checking off the day right after the last completion (the usual case) is a
+    single conditional update; anything else, such as un-checking or back-filling
+    a past day, recomputes that one habit from its completions.
+    """
+    habits = get_habits_collection()
+    day = as_date(completion_date)
+
+    habit = habits.find_one({"_id": ObjectId(habit_id)}, {field: 1 for field in COUNTER_FIELDS})
+    if habit is None:
+        return
+    if not completed or not has_counters(habit):
+        rebuild_habit_counters(habit_id)
+        return
+
+    last = as_date(habit["last_completed_date"])
+    if last is not None and day <= last:
+        rebuild_habit_counters(habit_id)
+        return
+
+    streak = habit["current_streak"] + 1 if last == day - timedelta(days=1) else 1
+
+    # Only applies if nobody else changed the counters since we read them
+    result = habits.update_one(
+        {
+            "_id": ObjectId(habit_id),
+            "last_completed_date": habit["last_completed_date"],
+            "current_streak": habit["current_streak"],
+        },
+        {
+            "$set": {
+                "current_streak": streak,
+                "last_completed_date": midnight(day),
+            },
+            "$max": {"longest_streak": streak},
+            "$inc": {"total_completions": 1},
+        }
+    )
+    if result.modified_count == 0:
+        rebuild_habit_counters(habit_id)
+
+
+def apply_completion_changes(changes):
+    """
+    Counter upkeep after many days were written at once: the fast path for a
+    habit with a single change, one rebuild for a habit with several.
+    `changes` holds (habit_id, date, completed) tuples.
+    """
+    by_habit = {}
+    for habit_id, day, completed in changes:
+        by_habit.setdefault(str(habit_id), []).append((day, completed))
+    for habit_id, habit_changes in by_habit.items():
+        if len(habit_changes) == 1:
+            apply_completion_change(habit_id, *habit_changes[0])
+        else:
+            rebuild_habit_counters(habit_id)
+
+
+def _rebuild_batch(habits: list, fix: bool):
+    """Check one batch of habits against their completions; returns the drifted ids"""
+    # One indexed (habit_id, day) query for the whole batch
+    dates_by_habit = {}
+    for habit_id, day in iter_completed_days(habit_ids=[habit["_id"] for habit in habits]):
+        dates_by_habit.setdefault(habit_id, []).append(day)
+
+    drifted = []
+    operations = []
+    for habit in habits:
+        counters = counters_from_dates(dates_by_habit.get(habit["_id"], []))
+        if any(habit.get(field) != value for field, value in counters.items()) or not has_counters(habit):
+            drifted.append(str(habit["_id"]))
+            operations.append(UpdateOne({"_id": habit["_id"]}, {"$set": counters}))
+
+    if fix and operations:
+        get_habits_collection().bulk_write(operations, ordered=False)
+    return drifted
+
+
+def rebuild_all_counters(user_id: str = None, fix: bool = True, batch_size: int = 500):
+    """
+    Recompute counters for every habit (or one user's habits) from completions,
+    a batch of habits at a time so memory stays bounded.
+    Returns the ids of habits whose stored counters had drifted; with fix=False
+    nothing is written, so this doubles as a drift check.
+    """
+    habits = get_habits_collection()
+
+    habit_query = {}
+    if user_id is not None:
+        habit_query["user_id"] = ObjectId(user_id)
+
+    drifted = []
+    batch = []
+    cursor = habits.find(habit_query, {field: 1 for field in COUNTER_FIELDS}).batch_size(batch_size)
+    for habit in cursor:
+        batch.append(habit)
+        if len(batch) >= batch_size:
+            drifted.extend(_rebuild_batch(batch, fix))
+            batch = []
+    if batch:
+        drifted.extend(_rebuild_batch(batch, fix))
+
+    return drifted
+
+
+if __name__ == "__main__":
+    # python -m utils.streaks [--check] [user_id]
+    #   default   -> backfill/repair the stored counters
+    #   --check   -> only report habits whose counters have drifted
+    args = sys.argv[1:]
+    check_only = "--check" in args
+    args = [a for a in args if a != "--check"]
+
+    drifted = rebuild_all_counters(args[0] if args else None, fix=not check_only)
+    action = "drifted" if check_only else "repaired"
+    print(f"{len(drifted)} habit(s) {action}")
+    for habit_id in drifted:
+        print(f"  - {habit_id}")
+    sys.exit(1 if check_only and drifted else 0)
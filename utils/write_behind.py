@@ -0,0 +1,293 @@
+"""
+Write-behind queue for check-ins.
+
+With CHECKIN_WRITE_BEHIND=1, mark_completion records the check-in in a local
+SQLite file (WAL mode, fsync on commit) and returns straight away. A
+background thread flushes queued check-ins to MongoDB in batches of
+idempotent upserts, retrying with exponential backoff while the database is
+slow or unavailable. Until a check-in is flushed, pages overlay it on what
+they read from MongoDB so the user sees a consistent state.
+
+Only the latest state of each (habit, day) is kept: checking and un-checking
+a habit before the flush results in a single write.
+"""
+from utils.database import (
+    get_completions_collection, get_completion_buckets_collection, use_buckets
+)
+from utils.streaks import apply_completion_changes
+from utils.buckets import bucket_update
+from utils import cache
+from utils.days import day_number, midnight
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime, date
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+
+ENABLED = os.getenv("CHECKIN_WRITE_BEHIND", "0") in ("1", "true", "True")
+
+QUEUE_PATH = os.getenv("CHECKIN_QUEUE_PATH", "checkin_queue.db")
+
+# Check-ins written per bulk_write, and how often the flusher wakes up on its own
+FLUSH_BATCH_SIZE = int(os.getenv("CHECKIN_FLUSH_BATCH_SIZE", "200"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("CHECKIN_FLUSH_INTERVAL_SECONDS", "1"))
+
+# Retry delay doubles after every failed attempt, up to the maximum. After
+# MAX_ATTEMPTS a check-in is parked as failed and no longer retried.
+RETRY_BASE_SECONDS = float(os.getenv("CHECKIN_RETRY_BASE_SECONDS", "1"))
+RETRY_MAX_SECONDS = float(os.getenv("CHECKIN_RETRY_MAX_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.getenv("CHECKIN_MAX_ATTEMPTS", "50"))
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkins (
+    habit_id     TEXT NOT NULL,
+    day          TEXT NOT NULL,
+    user_id      TEXT NOT NULL,
+    completed    INTEGER NOT NULL,
+    note         TEXT NOT NULL DEFAULT '',
+    queued_at    REAL NOT NULL,
+    version      INTEGER NOT NULL DEFAULT 1,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error   TEXT,
+    PRIMARY KEY (habit_id, day)
+);
+CREATE INDEX IF NOT EXISTS checkins_user ON checkins (user_id, day);
+CREATE INDEX IF NOT EXISTS checkins_due ON checkins (next_attempt);
+"""
+
+
+_local = threading.local()
+
+
+def _connection():
+    """One SQLite connection per thread (and per process after a fork)"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(QUEUE_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Every acknowledged check-in must survive a crash or power loss
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+_wakeup = threading.Event()
+
+
+def enqueue(habit_id: str, user_id: str, day, completed: bool, note: str = ""):
+    """Durably queue one check-in, replacing any queued state for the same day"""
+    if isinstance(day, datetime):
+        day = day.date()
+    _connection().execute(
+        """
+        INSERT INTO checkins (habit_id, day, user_id, completed, note, queued_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (habit_id, day) DO UPDATE SET
+            completed = excluded.completed,
+            note = excluded.note,
+            queued_at = excluded.queued_at,
+            version = version + 1,
+            attempts = 0,
+            next_attempt = 0,
+            last_error = NULL
+        """,
+        (str(habit_id), day.isoformat(), str(user_id), int(completed), note, time.time())
+    )
+    _wakeup.set()
+
+
+def pending_changes(user_id: str, start_date: date = None, end_date: date = None, parked: bool = False):
+    """
+    Queued check-ins not yet in MongoDB: {(habit_id, date): completed}.
+    With parked=True, the ones that failed MAX_ATTEMPTS times and are no longer retried.
+    """
+    query = f"SELECT habit_id, day, completed FROM checkins WHERE user_id = ? AND attempts {'>=' if parked else '<'} ?"
+    params = [str(user_id), MAX_ATTEMPTS]
+    if start_date is not None:
+        query += " AND day >= ?"
+        params.append(start_date.isoformat())
+    if end_date is not None:
+        query += " AND day <= ?"
+        params.append(end_date.isoformat())
+    return {
+        (habit_id, date.fromisoformat(day)): bool(completed)
+        for habit_id, day, completed in _connection().execute(query, params)
+    }
+
+
+def overlay_status(user_id: str, status: dict, check_date: date):
+    """
+    Apply queued check-ins to a {habit_id: completed} status for one day.
+    Returns (status, set of habit ids whose state is still being saved).
+    Parked check-ins are left out: the status shows what MongoDB holds.
+    """
+    if not ENABLED:
+        return status, set()
+    # The status may be a shared cached value, so overlay a copy
+    status = dict(status)
+    saving = set()
+    for (habit_id, _), completed in pending_changes(user_id, check_date, check_date).items():
+        if habit_id in status:
+            status[habit_id] = completed
+            saving.add(habit_id)
+    return status, saving
+
+
+def _backoff(attempts: int) -> float:
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+def _operation(row, buckets: bool):
+    habit_id, day, user_id, completed, note, queued_at = row[:6]
+    completion_date = midnight(date.fromisoformat(day))
+    logged_at = datetime.fromtimestamp(queued_at)
+    if buckets:
+        query, update = bucket_update(habit_id, user_id, completion_date, bool(completed), note, logged_at)
+        return UpdateOne(query, update, upsert=True)
+    return UpdateOne(
+        {"habit_id": ObjectId(habit_id), "completion_date": completion_date},
+        {
+            "$set": {
+                "completed": bool(completed), "note": note, "logged_at": logged_at,
+                # Stamped at flush time: rollups look for changes by updated_at
+                "updated_at": datetime.now(), "day": day_number(completion_date)
+            },
+            "$setOnInsert": {"user_id": ObjectId(user_id)}
+        },
+        upsert=True
+    )
+
+
+def flush(batch_size: int = None):
+    """
+    Write one batch of due check-ins to MongoDB.
+    Returns (written, failed); a row re-queued by the user while it was being
+    written stays queued for the next flush.
+    """
+    conn = _connection()
+    now = time.time()
+    rows = conn.execute(
+        """
+        SELECT habit_id, day, user_id, completed, note, queued_at, version, attempts
+        FROM checkins
+        WHERE next_attempt <= ? AND attempts < ?
+        ORDER BY queued_at
+        LIMIT ?
+        """,
+        (now, MAX_ATTEMPTS, batch_size or FLUSH_BATCH_SIZE)
+    ).fetchall()
+    if not rows:
+        return 0, 0
+
+    buckets = use_buckets()
+    errors = {}
+    try:
+        collection = get_completion_buckets_collection() if buckets else get_completions_collection()
+        collection.bulk_write([_operation(row, buckets) for row in rows], ordered=False)
+    except BulkWriteError as e:
+        errors = {error["index"]: error.get("errmsg", "write failed") for error in e.details.get("writeErrors", [])}
+    except Exception as e:
+        errors = {index: str(e) for index in range(len(rows))}
+
+    written = []
+    users = set()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for index, (habit_id, day, _, completed, _, _, version, attempts) in enumerate(rows):
+            if index in errors:
+                conn.execute(
+                    """
+                    UPDATE checkins SET attempts = ?, next_attempt = ?, last_error = ?
+                    WHERE habit_id = ? AND day = ? AND version = ?
+                    """,
+                    (attempts + 1, now + _backoff(attempts + 1), errors[index], habit_id, day, version)
+                )
+            else:
+                conn.execute(
+                    "DELETE FROM checkins WHERE habit_id = ? AND day = ? AND version = ?",
+                    (habit_id, day, version)
+                )
+                written.append((habit_id, date.fromisoformat(day), bool(completed)))
+                users.add(rows[index][2])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    apply_completion_changes(written)
+    for user_id in users:
+        cache.invalidate(user_id, "status", "habits")
+
+    if errors:
+        first = next(iter(errors.values()))
+        print(f"❌ {len(errors)} queued check-in(s) could not be written, will retry: {first}")
+    return len(written), len(errors)
+
+
+def failed_habits(user_id: str, check_date: date):
+    """Ids of habits whose check-in for the day was parked after failing MAX_ATTEMPTS times"""
+    if not ENABLED:
+        return set()
+    return {habit_id for habit_id, _ in pending_changes(user_id, check_date, check_date, parked=True)}
+
+
+def queue_stats():
+    """Counts of queued, retrying and parked check-ins"""
+    queued, retrying, parked = _connection().execute(
+        """
+        SELECT COUNT(*),
+               COALESCE(SUM(attempts > 0 AND attempts < ?), 0),
+               COALESCE(SUM(attempts >= ?), 0)
+        FROM checkins
+        """,
+        (MAX_ATTEMPTS, MAX_ATTEMPTS)
+    ).fetchone()
+    return {"queued": queued, "retrying": retrying, "failed": parked}
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _flusher_loop():
+    while True:
+        _wakeup.wait(FLUSH_INTERVAL_SECONDS)
+        _wakeup.clear()
+        try:
+            # Keep going while full batches are being written
+            while flush()[0] >= FLUSH_BATCH_SIZE:
+                pass
+        except Exception as e:
+            print(f"❌ Check-in flusher error: {e}")
+
+
+def start_flusher():
+    """Start the background flush thread for this process (once)"""
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flusher_loop, name="checkin-flusher", daemon=True)
+            _flusher.start()
+    return _flusher
+
+
+if __name__ == "__main__":
+    # python -m utils.write_behind   -> flush everything that is due, then report
+    total = 0
+    while True:
+        written, failed = flush()
+        total += written
+        if written == 0 or failed:
+            break
+    print(f"Flushed {total} check-in(s)")
+    print(queue_stats())
+    sys.exit(1 if queue_stats()["queued"] else 0)